@@ -1,11 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field, ValidationError, field_validator
+from typing import List, Literal, Optional
 import os
-import tempfile
-from utils import get_company_articles, analyze_sentiment, perform_comparative_analysis, generate_hindi_tts, translate_to_hindi
-import base64
+from utils import get_company_articles, perform_comparative_analysis, generate_hindi_tts, translate_to_hindi, article_upstream, get_newsapi_coalescer, transcode_audio, extract_topics, AUDIO_MIME_TYPES
+from cache import ResponseCache, CachedResponse, article_fingerprint, etag_matches, make_etag
+from limits import AdmissionQueue, AdmissionRejected, ClientRateLimiter, quota_ledger, request_priority
+from breakers import BREAKER_HEADER, breakers, breaker_header, breaker_states
+from sentiment import get_scheduler
+from profiling import profile_call
+from tts_segments import TTS_MODE, build_hindi_summary, stitch_segments, warm_segments
+from companies import get_registry
+from jobs import JOB_MAX_WAIT, JobFailed, JobQueueFull, JobStore
+from sharding import FORWARDED_HEADER, SERVED_BY_HEADER, ClusterRouter
+from feed import FEED_ARTICLE_COUNT, SentimentFeed
+from deadline import Deadline, plan_sentiment, request_deadline, stage_costs
+from lexicon import keyword_sentiment
+from memory import memory_tracker
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import asyncio
+import hmac
+import json
 import logging
+import threading
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -24,113 +45,733 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bump whenever the pipeline output changes so cached responses are not reused
+PIPELINE_VERSION = "3"
+
+# Assembled responses, keyed by company, article count, pipeline version and fields
+response_cache = ResponseCache()
+
+# Admission control: bounded in-flight requests and a token bucket per client
+admission_queue = AdmissionQueue()
+client_limiter = ClientRateLimiter()
+
+# Companies are sharded across CLUSTER_NODES so each one's caches live on one node
+cluster_router = ClusterRouter()
+
+# Analyses queued through /jobs, run on their own worker pool. Job ids start with the
+# tag of the node holding them, so polls reaching another node are sent on to it
+job_store = JobStore(id_prefix=f"{cluster_router.tag}-" if cluster_router.tag else "")
+
+# Sections the live feed diffs between refreshes
+FEED_FIELDS = ["articles", "topics", "sentiment_distribution"]
+
+# Headers of the owner node's response that are passed back to the client
+FORWARDED_RESPONSE_HEADERS = ["Content-Type", "ETag", "Cache-Control", "Vary", "Retry-After", BREAKER_HEADER]
+
+# Token required by the /admin endpoints, which are disabled when it is not set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Size of the chunks audio is streamed in
+AUDIO_CHUNK_SIZE = 64 * 1024
+
+# Response sections a caller can select through `include` (alias `fields`)
+RESPONSE_FIELDS = ["articles", "topics", "sentiment_distribution", "comparative",
+                   "final_sentiment", "hindi_summary", "audio"]
+
+# Pipeline stages in the order they run, as reported in job progress
+PIPELINE_STAGES = ["articles", "sentiment", "topics", "comparative", "final_sentiment",
+                   "translation", "tts"]
+
+class ClusterMembership(BaseModel):
+    nodes: List[str]
+
 class CompanyRequest(BaseModel):
     company_name: str
     article_count: int = 10
+    include: Optional[List[str]] = Field(
+        None, validation_alias=AliasChoices("include", "fields"))
+    priority: Literal["interactive", "background"] = "interactive"
+    audio_format: Literal["mp3", "opus", "wav"] = "mp3"
+    latency_budget_ms: Optional[int] = Field(None, gt=0)
+
+    @field_validator("company_name")
+    @classmethod
+    def check_company_name(cls, value):
+        # Aliases and tickers ("TSLA", "Tesla Inc") share one cache entry with the canonical name
+        value = get_registry().canonicalize(value)
+        if not value:
+            raise ValueError("Company name must not be empty")
+        return value
+
+    @field_validator("include")
+    @classmethod
+    def check_include(cls, value):
+        if value is None:
+            return value
+        fields = [field.strip().lower().replace(" ", "_") for field in value]
+        unknown = [field for field in fields if field not in RESPONSE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}, expected any of {RESPONSE_FIELDS}")
+        return fields
+
+@app.on_event("startup")
+async def start_tts_warmup():
+    # Pre-synthesize the summary fragments in the background for template TTS
+    if TTS_MODE == "template":
+        threading.Thread(target=warm_segments, daemon=True).start()
+
+@app.middleware("http")
+async def add_node_header(http_request: Request, call_next):
+    # Tell clients which node built the response, forwarded responses already carry it
+    response = await call_next(http_request)
+    if cluster_router.node_url and SERVED_BY_HEADER not in response.headers:
+        response.headers[SERVED_BY_HEADER] = cluster_router.node_url
+    return response
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the News Analysis API", 
-            "endpoints": ["/analyze (POST)"],
+            "endpoints": ["/analyze (POST)", "/analyze (GET)", "/analyze/audio (POST)",
+                          "/analyze/audio (GET)", "/jobs (POST)", "/jobs/{job_id} (GET)",
+                          "/companies (GET)", "/ws/sentiment (WebSocket)", "/admin/status (GET)"],
             "documentation": "/docs or /redoc"}
 
 @app.post("/analyze")
-async def analyze_company(request: CompanyRequest):
+async def analyze_company(request: CompanyRequest, http_request: Request,
+                          if_none_match: Optional[str] = Header(None), profile: bool = False,
+                          x_profile: Optional[str] = Header(None), x_admin_token: Optional[str] = Header(None)):
     logger.info(f"Received analysis request for company: {request.company_name}")
     
+    # The budget starts now, forwarding and waiting for admission count against it
+    deadline = request_deadline_for(request)
+    if profile or x_profile == "1":
+        # Admins can run a single request under the profiler, bypassing the cache
+        require_admin(x_admin_token)
+        entry, report = await run_admitted(request, http_request, deadline, profile=True)
+        body = json.loads(entry.body)
+        body["Profile"] = report
+        return JSONResponse(body, headers={"Cache-Control": "no-store"})
+    
+    forwarded = await forward_to_owner(request, http_request, "/analyze", if_none_match, deadline)
+    if forwarded is not None:
+        return forwarded
+    
+    entry = await run_admitted(request, http_request, deadline)
+    return cached_response(entry, if_none_match)
+
+@app.get("/analyze")
+async def analyze_company_get(http_request: Request, company_name: str, article_count: int = 10,
+                              include: Optional[str] = None, priority: str = "interactive",
+                              audio_format: str = "mp3", if_none_match: Optional[str] = Header(None),
+                              latency_budget_ms: Optional[int] = None,
+                              profile: bool = False, x_profile: Optional[str] = Header(None),
+                              x_admin_token: Optional[str] = Header(None)):
+    """Cacheable variant of /analyze for reverse proxies, `include` is comma separated"""
+    request = parse_query_request(company_name=company_name, article_count=article_count,
+                                  include=include.split(",") if include else None,
+                                  priority=priority, audio_format=audio_format,
+                                  latency_budget_ms=latency_budget_ms)
+    
+    return await analyze_company(request, http_request, if_none_match, profile, x_profile, x_admin_token)
+
+@app.post("/analyze/audio")
+async def analyze_company_audio(request: CompanyRequest, http_request: Request,
+                                if_none_match: Optional[str] = Header(None)):
+    """Stream only the Hindi summary audio, in the format given by `audio_format`"""
+    logger.info(f"Received audio request for company: {request.company_name}")
+    
+    request = request.model_copy(update={"include": ["audio"]})
+    deadline = request_deadline_for(request)
+    forwarded = await forward_to_owner(request, http_request, "/analyze/audio", if_none_match, deadline)
+    if forwarded is not None:
+        return forwarded
+    
+    entry = await run_admitted(request, http_request, deadline)
+    return audio_response(entry, if_none_match)
+
+@app.get("/analyze/audio")
+async def analyze_company_audio_get(http_request: Request, company_name: str, article_count: int = 10,
+                                    format: Optional[str] = None, priority: str = "interactive",
+                                    accept: Optional[str] = Header(None),
+                                    if_none_match: Optional[str] = Header(None)):
+    """Stream the audio, picking the format from `format` or the Accept header"""
+    request = parse_query_request(company_name=company_name, article_count=article_count,
+                                  include=["audio"], priority=priority,
+                                  audio_format=format or negotiate_audio_format(accept))
+    
+    return await analyze_company_audio(request, http_request, if_none_match)
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: CompanyRequest, http_request: Request):
+    """Queue an analysis and return its job id without waiting for the result"""
+    logger.info(f"Received analysis job for company: {request.company_name}")
+    
     try:
-        # Get news articles
-        articles = get_company_articles(request.company_name, request.article_count)
-        
-        if not articles:
-            raise HTTPException(status_code=404, detail=f"Could not find news articles for {request.company_name}")
-        
-        logger.info(f"Found {len(articles)} articles for {request.company_name}")
-        
-        # Perform sentiment analysis for each article
-        for article in articles:
-            article["Sentiment"] = analyze_sentiment(article["Summary"])
+        client = client_id(http_request)
+        client_limiter.check(client)
+        # Like /analyze, the budget counts from arrival, so time queued for a worker is spent
+        deadline = request_deadline_for(request)
+        job = job_store.submit(lambda progress: run_job(request, progress, client, deadline),
+                               request.model_dump(), job_stages(request.include))
+    except (AdmissionRejected, JobQueueFull) as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    
+    return JSONResponse(job.snapshot(), status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, http_request: Request, wait: float = Query(0, ge=0, le=JOB_MAX_WAIT),
+                  since: Optional[int] = None):
+    """
+    Job status, progress per stage and, once finished, the result.
+    
+    With `wait` the request long-polls for up to that many seconds until the job
+    finishes, or with `since` until its version moves past the one given.
+    """
+    # Jobs only live on the node that accepted them
+    tag, _, _ = job_id.rpartition("-")
+    node = cluster_router.node_for_tag(tag) if not http_request.headers.get(FORWARDED_HEADER) else None
+    if node is not None:
+        params = {"wait": wait} if since is None else {"wait": wait, "since": since}
+        response = await run_in_threadpool(cluster_router.forward, node, f"/jobs/{job_id}", None, {},
+                                           method="GET", params=params)
+        if response is None:
+            raise HTTPException(status_code=503, detail=f"Node holding job {job_id} cannot be reached")
+        return proxied_response(response, node)
+    
+    job = await job_store.wait(job_id, wait, since)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job {job_id}")
+    return JSONResponse(job.snapshot(), headers={"Cache-Control": "no-store"})
+
+def job_stages(include):
+    """Pipeline stages a job reports progress for, in pipeline order"""
+    # Articles and sentiment always run, the other stages depend on `include`
+    _, stages = plan_stages(include)
+    stages |= {"articles", "sentiment"}
+    return [stage for stage in PIPELINE_STAGES if stage in stages]
+
+def analyze_on_owner(request, client, deadline=None):
+    """
+    Have the node owning the company build an analysis that was started here.
+    
+    Used by jobs and feed refreshes, which are not tied to an HTTP request that
+    could be proxied as a whole. Returns the owner's response body, or None when
+    this node should build it: it owns the company, or the owner is down or busy.
+    """
+    node = cluster_router.owner(request.company_name)
+    if node is None:
+        return None
+    response = cluster_router.forward(node, "/analyze", request.model_dump(), {"X-Client-Id": client}, deadline)
+    if response is None or response.status_code == 429 or response.status_code >= 500:
+        return None
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+    return response.json()
+
+def run_job(request, progress, client, deadline=None):
+    """Run a queued analysis on a job worker, returning the response body"""
+    # Upstream calls in utils read the priority to decide which quota they may use,
+    # and the deadline to cap their timeouts
+    request_priority.set(request.priority)
+    request_deadline.set(deadline)
+    try:
+        body = analyze_on_owner(request, client, deadline)
+        if body is not None:
+            # The owner ran the pipeline, its stages are not visible from here
+            for stage in job_stages(request.include):
+                progress(stage, "forwarded")
+            return body
+        entry = get_cached_analysis(request.company_name, request.article_count, request.include,
+                                    request.audio_format, progress=progress)
+    except HTTPException as e:
+        raise JobFailed(e.status_code, e.detail)
+    return json.loads(entry.body)
+
+async def fetch_feed_update(company):
+    """Analysis the live feed diffs, shared with /analyze through the response cache"""
+    # Feed refreshes only spend quota that interactive requests can spare
+    request = CompanyRequest(company_name=company, article_count=FEED_ARTICLE_COUNT,
+                             include=FEED_FIELDS, priority="background")
+    body = await run_in_threadpool(analyze_on_owner, request, f"feed@{cluster_router.node_url}")
+    if body is not None:
+        return body
+    request_priority.set("background")
+    entry = await run_in_threadpool(get_cached_analysis, request.company_name, FEED_ARTICLE_COUNT, FEED_FIELDS)
+    return json.loads(entry.body)
+
+sentiment_feed = SentimentFeed(fetch_feed_update)
+
+@app.websocket("/ws/sentiment")
+async def sentiment_websocket(websocket: WebSocket):
+    """
+    Live sentiment updates for a watchlist of companies.
+    
+    Clients send {"action": "subscribe" or "unsubscribe", "companies": [...]} and
+    receive a snapshot per company, then only new articles and changed
+    sentiment distributions as the feed refreshes.
+    """
+    await websocket.accept()
+    subscriber = sentiment_feed.connect()
+    
+    async def send_updates():
+        # The only writer on the socket, messages arrive already serialized
+        while True:
+            await websocket.send_text(await subscriber.queue.get())
+    
+    sender = asyncio.create_task(send_updates())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action = message.get("action")
+                companies = message.get("companies", [])
+                if not isinstance(companies, list) or not all(isinstance(name, str) for name in companies):
+                    raise ValueError("companies must be a list of company names")
+                companies = [get_registry().canonicalize(name) for name in companies if name.strip()]
+                if action == "subscribe":
+                    sentiment_feed.subscribe(subscriber, companies)
+                elif action == "unsubscribe":
+                    sentiment_feed.unsubscribe(subscriber, companies)
+                else:
+                    raise ValueError(f"Unknown action {action!r}, expected subscribe or unsubscribe")
+                reply = {"Type": "subscribed", "Companies": sorted(subscriber.companies)}
+            except (ValueError, AttributeError, TypeError) as e:
+                reply = {"Type": "error", "Detail": str(e)}
+            subscriber.offer(json.dumps(reply), sentiment_feed)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        try:
+            await sender
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # The client went away mid-send, or the socket broke
+            logger.error(f"Sentiment feed sender failed: {str(e)}", exc_info=True)
+        sentiment_feed.disconnect(subscriber)
+
+@app.get("/companies")
+async def list_companies(prefix: str = "", limit: int = Query(10, ge=1, le=100)):
+    """Autocomplete company names by name, ticker or alias prefix"""
+    registry = get_registry()
+    if prefix.strip():
+        companies = registry.complete(prefix, limit)
+    else:
+        companies = registry.entries(limit)
+    # The registry only changes on redeploy, so clients may cache suggestions for a while
+    return JSONResponse({"Companies": companies}, headers={"Cache-Control": "public, max-age=3600"})
+
+def parse_query_request(**params):
+    """Build a CompanyRequest from query parameters, reporting problems as a 422"""
+    try:
+        return CompanyRequest(**params)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+def negotiate_audio_format(accept):
+    """Pick the first supported audio format listed in an Accept header, MP3 by default"""
+    if not accept:
+        return "mp3"
+    
+    media_types = {"audio/mpeg": "mp3", "audio/mp3": "mp3", "audio/ogg": "opus", "audio/opus": "opus",
+                   "audio/wav": "wav", "audio/x-wav": "wav", "audio/wave": "wav"}
+    candidates = []
+    for position, item in enumerate(accept.split(",")):
+        parts = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if parts[0].lower() in media_types and quality > 0:
+            candidates.append((-quality, position, media_types[parts[0].lower()]))
+    
+    return min(candidates)[2] if candidates else "mp3"
+
+async def forward_to_owner(request, http_request, path, if_none_match=None, deadline=None):
+    """
+    Proxy a request to the node owning its company.
+    
+    Returns the owner's response, or None when this node should serve the request:
+    it owns the company, the request was already forwarded once, or the owner is down.
+    """
+    if http_request.headers.get(FORWARDED_HEADER):
+        return None
+    node = cluster_router.owner(request.company_name)
+    if node is None:
+        return None
+    
+    # The owner rate-limits on behalf of the original client
+    headers = {"X-Client-Id": client_id(http_request)}
+    if if_none_match:
+        headers["If-None-Match"] = if_none_match
+    response = await run_in_threadpool(cluster_router.forward, node, path,
+                                       request.model_dump(), headers, deadline)
+    if response is None:
+        return None
+    return proxied_response(response, node)
+
+def proxied_response(response, node):
+    """Pass a forwarded request's response on to the client"""
+    headers = {name: response.headers[name] for name in FORWARDED_RESPONSE_HEADERS
+               if name in response.headers}
+    headers[SERVED_BY_HEADER] = response.headers.get(SERVED_BY_HEADER, node)
+    return Response(content=response.content, status_code=response.status_code, headers=headers)
+
+def request_deadline_for(request):
+    """Start the latency budget of a request, None when it has none"""
+    return Deadline(request.latency_budget_ms) if request.latency_budget_ms else None
+
+async def run_admitted(request, http_request, deadline=None, profile=False):
+    """
+    Run a request through rate limiting and admission control, then the cached pipeline.
+    
+    `deadline` is the request's latency budget, started when it arrived. Returns
+    the cache entry, or (entry, profile report) for profiled requests.
+    """
+    try:
+        client_limiter.check(client_id(http_request))
+        await admission_queue.acquire(request.priority)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected request for {request.company_name}: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    
+    started = time.monotonic()
+    try:
+        # Upstream calls in utils read the priority to decide which quota they may use,
+        # and the deadline to cap their timeouts
+        request_priority.set(request.priority)
+        request_deadline.set(deadline)
+        call = (get_cached_analysis, request.company_name, request.article_count, request.include,
+                request.audio_format)
+        if profile:
+            return await run_in_threadpool(profile_call, request.company_name, *call, refresh=True)
+        return await run_in_threadpool(*call)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error during analysis: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission_queue.release(time.monotonic() - started)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency guarding the admin endpoints with the ADMIN_TOKEN header"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled, set ADMIN_TOKEN to enable them")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/admin/status", dependencies=[Depends(require_admin)])
+async def admin_status():
+    """Upstream circuit breakers, quota usage and admission queue state"""
+    return {"Circuit Breakers": breaker_states(),
+            "Quotas": quota_ledger.snapshot(),
+            "Admission": admission_queue.snapshot(),
+            "Sentiment Batching": get_scheduler().stats(),
+            "NewsAPI Coalescing": get_newsapi_coalescer().stats(),
+            "Jobs": job_store.snapshot(),
+            "Cluster": cluster_router.snapshot(),
+            "Live Feed": sentiment_feed.stats(),
+            "Stage Estimates": stage_costs.snapshot(),
+            "Memory": memory_tracker.snapshot()}
+
+@app.post("/admin/breakers/{upstream}/reset", dependencies=[Depends(require_admin)])
+async def reset_breaker(upstream: str):
+    if upstream not in breakers:
+        raise HTTPException(status_code=404, detail=f"Unknown upstream {upstream}")
+    breakers[upstream].reset()
+    return {upstream: breakers[upstream].snapshot()}
+
+@app.put("/admin/cluster", dependencies=[Depends(require_admin)])
+async def update_cluster(membership: ClusterMembership):
+    """Replace this node's view of the cluster, e.g. when a node joins or leaves"""
+    cluster_router.set_nodes(membership.nodes)
+    logger.info(f"Cluster membership updated: {membership.nodes}")
+    return cluster_router.snapshot()
+
+def client_id(http_request):
+    """
+    Identify the caller for rate limiting by its address.
+    
+    A forwarded request comes from the node that accepted it, so the owner takes
+    the original client from its X-Client-Id header. The header is only trusted
+    from cluster nodes, anyone else could dodge the limit by rotating it.
+    """
+    explicit = http_request.headers.get("X-Client-Id")
+    if explicit and cluster_router.is_peer(http_request.headers):
+        return explicit
+    return http_request.client.host if http_request.client else "unknown"
+
+def get_cached_analysis(company_name, article_count, include=None, audio_format="mp3", refresh=False,
+                        progress=None):
+    """
+    Return the cached response for a request, rebuilding it if the article set changed.
+    
+    Fresh entries are served as they are. Once an entry is older than the cache TTL
+    the articles are fetched again and the rest of the pipeline only reruns when
+    their fingerprint differs from the one the entry was built from. With `refresh`
+    the whole pipeline runs regardless of what is cached. `progress(stage, state)`
+    is told when each pipeline stage starts and finishes.
+    """
+    company_key = company_name.strip()
+    # The format only matters when audio is part of the response
+    wants_audio = include is None or "audio" in include
+    key = (company_key, article_count, PIPELINE_VERSION,
+           tuple(sorted(include)) if include is not None else None, audio_format if wants_audio else None)
+    
+    entry = response_cache.get(key) if not refresh else None
+    if entry is not None and entry.is_fresh():
+        logger.info(f"Serving cached analysis for {company_name}")
+        return entry
+    
+    # Once the article upstream runs low on quota, a stale response beats spending it
+    if entry is not None and not quota_ledger.available(article_upstream()):
+        logger.info(f"Article quota low, serving stale analysis for {company_name}")
+        return entry
+    
+    # Refetching would not fit the latency budget, the stale response has to do
+    deadline = request_deadline.get()
+    if entry is not None and deadline is not None and not deadline.allows(stage_costs.estimate("articles")):
+        logger.info(f"Latency budget too short to refetch, serving stale analysis for {company_name}")
+        response = json.loads(entry.body)
+        response["Degraded Stages"] = {"articles": "stale"}
+        return CachedResponse(company_key, article_count, entry.fingerprint, response)
+    
+    # With MEMORY_TRACKING set, allocations are charged to the stages reported through progress
+    tracked = memory_tracker.track(progress)
+    progress = tracked or progress
+    
+    if progress:
+        progress("articles", "running")
+    started = time.monotonic()
+    articles = get_company_articles(company_name, article_count)
+    stage_costs.record("articles", time.monotonic() - started)
+    if progress:
+        progress("articles", "done")
+    fingerprint = article_fingerprint(articles) if articles else None
+    
+    if entry is not None and entry.fingerprint == fingerprint:
+        logger.info(f"Article set unchanged for {company_name}, reusing cached analysis")
+        return response_cache.touch(key) or entry
+    
+    response = run_analysis(company_name, article_count, include, articles=articles,
+                            audio_format=audio_format, progress=progress)
+    entry = CachedResponse(company_key, article_count, fingerprint, response)
+    if tracked:
+        tracked.finish()
+    if entry.degraded:
+        # Never serve a degraded response to requests that may have more time
+        return entry
+    return response_cache.store(key, entry)
+
+def cache_control(entry):
+    """Cache-Control for a cache entry, degraded responses must not be reused by anyone"""
+    if entry.degraded:
+        return "no-store"
+    return f"public, max-age={entry.max_age()}"
+
+def cached_response(entry, if_none_match=None):
+    """Turn a cache entry into an HTTP response, answering conditional requests with 304"""
+    # Breaker states are reported as of now, the cached body may be minutes old
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control(entry), BREAKER_HEADER: breaker_header()}
+    
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+def audio_response(entry, if_none_match=None):
+    """Stream the audio of a cache entry in chunks with its MIME type"""
+    try:
+        audio, audio_format = entry.audio()
+    except KeyError:
+        raise HTTPException(status_code=503, detail="Audio could not be produced within the latency budget")
+    etag = make_etag(audio)
+    # GET /analyze/audio picks the format from the Accept header, shared caches must key on it
+    headers = {"ETag": etag, "Cache-Control": cache_control(entry), "Vary": "Accept",
+               BREAKER_HEADER: breaker_header()}
+    
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    def chunks():
+        for start in range(0, len(audio), AUDIO_CHUNK_SIZE):
+            yield audio[start:start + AUDIO_CHUNK_SIZE]
+    
+    headers["Content-Length"] = str(len(audio))
+    return StreamingResponse(chunks(), media_type=AUDIO_MIME_TYPES[audio_format], headers=headers)
+
+def plan_stages(include=None):
+    """Work out which pipeline stages are needed to produce the requested fields"""
+    fields = set(include) if include is not None else set(RESPONSE_FIELDS)
+    stages = set()
+    
+    # Each field pulls in the stages it depends on, the rest are skipped
+    if "audio" in fields:
+        stages.add("tts")
+    if "audio" in fields or "hindi_summary" in fields:
+        stages.add("translation")
+    if stages or "final_sentiment" in fields:
+        stages.add("final_sentiment")
+    if stages or "comparative" in fields or "sentiment_distribution" in fields:
+        stages.add("comparative")
+    if "topics" in fields or "comparative" in fields:
+        stages.add("topics")
+    
+    return fields, stages
+
+def run_analysis(company_name, article_count, include=None, articles=None, audio_format="mp3",
+                 progress=None):
+    """Run the analysis pipeline, skipping stages whose output was not requested"""
+    fields, stages = plan_stages(include)
+    report = progress or (lambda stage, state: None)
+    deadline = request_deadline.get()
+    # Starts with what the article fetch had to give up
+    degraded = dict(deadline.degraded) if deadline is not None else {}
+    
+    # Get news articles, unless the caller already fetched them
+    if articles is None:
+        articles = get_company_articles(company_name, article_count)
+    
+    if not articles:
+        raise HTTPException(status_code=404, detail=f"Could not find news articles for {company_name}")
+    
+    logger.info(f"Found {len(articles)} articles for {company_name}")
+    
+    # Score fewer articles, or fall back to keywords, when the budget is short
+    scored_count, use_keywords = plan_sentiment(deadline, len(articles))
+    if scored_count < len(articles):
+        articles = articles[:scored_count]
+        degraded["articles"] = ", ".join(filter(None, [degraded.get("articles"), f"truncated to {scored_count}"]))
+    
+    # Perform sentiment analysis for each article, batched with other requests' articles
+    report("sentiment", "running")
+    started = time.monotonic()
+    if use_keywords:
+        sentiments = [keyword_sentiment(article["Summary"]) for article in articles]
+        degraded["sentiment"] = "keyword"
+    else:
+        futures = get_scheduler().submit_many([article["Summary"] for article in articles])
+        sentiments = []
+        for article, future in zip(articles, futures):
+            try:
+                sentiments.append(future.result(timeout=deadline.remaining() if deadline else None))
+            except FutureTimeoutError:
+                # Out of time while queued for the model, finish with the keyword scorer
+                sentiments.append(keyword_sentiment(article["Summary"]))
+                degraded["sentiment"] = "keyword"
+            except Exception as e:
+                # A failing backend must not fail the whole analysis, the keyword scorer stands in
+                if "sentiment" not in degraded:
+                    logger.error(f"Sentiment backend failed: {str(e)}", exc_info=True)
+                sentiments.append(keyword_sentiment(article["Summary"]))
+                degraded["sentiment"] = "keyword"
+        if "sentiment" not in degraded:
+            stage_costs.record("sentiment", time.monotonic() - started, len(articles))
+    
+    for article, sentiment in zip(articles, sentiments):
+        article["Sentiment"] = sentiment
+        if "topics" in stages:
             # Extract topics from summary
             article["Topics"] = extract_topics(article["Summary"])
-        
+        else:
+            # Mock articles come with canned topics, drop them when not requested
+            article.pop("Topics", None)
+    report("sentiment", "done")
+    if "topics" in stages:
+        report("topics", "done")
+    
+    response = {"Company": company_name}
+    
+    if "articles" in fields:
+        response["Articles"] = articles
+    elif "topics" in fields:
+        response["Articles"] = [{"Title": article["Title"], "Topics": article["Topics"]}
+                                for article in articles]
+    
+    if "comparative" in stages:
         # Perform comparative analysis
         comparative_analysis = perform_comparative_analysis(articles)
+        report("comparative", "done")
         
+        if "comparative" in fields:
+            response["Comparative Sentiment Score"] = comparative_analysis
+        elif "sentiment_distribution" in fields:
+            response["Comparative Sentiment Score"] = {
+                "Sentiment Distribution": comparative_analysis["Sentiment Distribution"]}
+    
+    if "final_sentiment" in stages:
         # Generate final sentiment summary
-        final_sentiment = generate_final_sentiment(comparative_analysis, request.company_name)
+        final_sentiment = generate_final_sentiment(comparative_analysis, company_name)
+        report("final_sentiment", "done")
+        if "final_sentiment" in fields:
+            response["Final Sentiment Analysis"] = final_sentiment
+    
+    if "translation" in stages:
+        report("translation", "running")
+        # Known companies get their Hindi summary assembled from template fragments
+        template = None
+        if TTS_MODE == "template":
+            overall, outlook = classify_sentiment(comparative_analysis["Sentiment Distribution"])
+            template = build_hindi_summary(company_name, overall, outlook,
+                                           comparative_analysis["Sentiment Distribution"])
         
-        # Convert to Hindi and generate TTS
-        hindi_summary = translate_to_hindi(final_sentiment)
+        if template is not None:
+            hindi_summary, segments = template
+        elif deadline is not None and not deadline.allows(stage_costs.estimate("translation")):
+            # Without a Hindi summary there is nothing to synthesize either
+            hindi_summary, segments = None, None
+            degraded["translation"] = "skipped"
+        else:
+            # Convert to Hindi
+            started = time.monotonic()
+            hindi_summary, segments = translate_to_hindi(final_sentiment), None
+            stage_costs.record("translation", time.monotonic() - started)
         logger.info(f"Translated to Hindi: {hindi_summary}")
+        report("translation", "skipped" if hindi_summary is None else "done")
+        if "hindi_summary" in fields and hindi_summary is not None:
+            response["Hindi Summary"] = hindi_summary
+    
+    # Stitch the stored fragments, no network call needed. Missing ones are queued for
+    # background synthesis and this request falls back to live synthesis
+    audio_bytes = stitch_segments(segments) if "tts" in stages and segments else None
+    
+    # Stitching is local, only live synthesis can be skipped
+    if "tts" in stages and (hindi_summary is None or (
+            audio_bytes is None and deadline is not None and not deadline.allows(stage_costs.estimate("tts")))):
+        stages.discard("tts")
+        degraded["tts"] = "skipped"
+        report("tts", "skipped")
+    
+    if "tts" in stages:
+        report("tts", "running")
+        if audio_bytes is not None:
+            audio_bytes, actual_format = transcode_audio(audio_bytes, "mp3", audio_format)
+        else:
+            started = time.monotonic()
+            audio_bytes, actual_format = generate_hindi_tts(hindi_summary, audio_format)
+            stage_costs.record("tts", time.monotonic() - started)
         
-        audio_file = generate_hindi_tts(hindi_summary)
-        
-        # Convert audio file to base64 for transmission
-        with open(audio_file, "rb") as f:
-            audio_data = base64.b64encode(f.read()).decode("utf-8")
-        
-        # Clean up temporary file
-        os.remove(audio_file)
-        
-        # Construct response
-        response = {
-            "Company": request.company_name,
-            "Articles": articles,
-            "Comparative Sentiment Score": comparative_analysis,
-            "Final Sentiment Analysis": final_sentiment,
-            "Hindi Summary": hindi_summary,
-            "Audio": audio_data
-        }
-        
-        return response
+        # Kept as raw bytes, the cache base64-encodes them in chunks while serializing
+        response["Audio"] = audio_bytes
+        response["Audio Format"] = actual_format
+        response["Audio MIME Type"] = AUDIO_MIME_TYPES[actual_format]
+        report("tts", "done")
     
-    except Exception as e:
-        logger.error(f"Error during analysis: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
-
-def extract_topics(text):
-    """Extract key topics from text"""
-    topics = []
-    keywords = {
-        "stock": "Stock Market",
-        "revenue": "Financial",
-        "profit": "Financial",
-        "sales": "Sales",
-        "product": "Product",
-        "innovation": "Innovation",
-        "tech": "Technology",
-        "regulation": "Regulation",
-        "legal": "Legal",
-        "expansion": "Expansion",
-        "growth": "Growth",
-        "market": "Market",
-        "customer": "Customer Relations",
-        "launch": "Product Launch",
-        "research": "Research & Development",
-        "invest": "Investment",
-        "competition": "Competition",
-        "partnership": "Partnership",
-        "acquisition": "Acquisition",
-        "merger": "Merger",
-        "fiscal": "Financial",
-        "quarterly": "Quarterly Report",
-        "annual": "Annual Report"
-    }
-    
-    for keyword, topic in keywords.items():
-        if keyword.lower() in text.lower() and topic not in topics:
-            topics.append(topic)
-    
-    # Add default topic if none found
-    if not topics:
-        topics = ["Business News"]
-    
-    return topics[:3]  # Limit to top 3 topics
-
-def generate_final_sentiment(comparative_analysis, company_name):
-    """Generate a final sentiment summary based on the comparative analysis"""
-    sentiment_dist = comparative_analysis["Sentiment Distribution"]
+    if degraded:
+        response["Degraded Stages"] = degraded
     
+    return response
+
+def classify_sentiment(sentiment_dist):
+    """Classify a sentiment distribution into an overall label and an outlook sentence"""
     # Calculate total articles for percentage
     total_articles = sum(sentiment_dist.values())
     
@@ -154,6 +795,13 @@ def generate_final_sentiment(comparative_analysis, company_name):
         overall = "mixed"
         outlook = "Situation requires monitoring."
     
+    return overall, outlook
+
+def generate_final_sentiment(comparative_analysis, company_name):
+    """Generate a final sentiment summary based on the comparative analysis"""
+    sentiment_dist = comparative_analysis["Sentiment Distribution"]
+    overall, outlook = classify_sentiment(sentiment_dist)
+    
     return f"{company_name}'s latest news coverage is {overall} ({sentiment_dist['Positive']} positive, {sentiment_dist['Negative']} negative, {sentiment_dist['Neutral']} neutral articles). {outlook}"
 
 if __name__ == "__main__":
@@ -2,25 +2,25 @@ import streamlit as st
 import requests
 import base64
 import io
-import json
 import time
 import pandas as pd
-import matplotlib.pyplot as plt
-import os
 import subprocess
-import threading
+from companies import get_registry
 
-# Function to start the API in a separate thread
+# Function to start the API in a separate process
 
 
+@st.cache_resource(show_spinner=False)
 def start_api():
-    subprocess.Popen(["uvicorn", "api:app", "--host",
-                     "0.0.0.0", "--port", "8000"])
+    """Start the API once per server process, not on every rerun"""
+    process = subprocess.Popen(["uvicorn", "api:app", "--host",
+                                "0.0.0.0", "--port", "8000"])
+    time.sleep(2)  # Give the API time to start
+    return process
 
 
 # Start the API when the app loads
-threading.Thread(target=start_api, daemon=True).start()
-time.sleep(2)  # Give the API time to start
+start_api()
 
 st.set_page_config(
     page_title="News Summarizer & Sentiment Analyzer",
@@ -64,7 +64,7 @@ st.markdown("""
 # Sidebar for API configuration
 with st.sidebar:
     st.title("⚙️ Configuration")
-    api_endpoint = "http://localhost:8000/analyze"  # Hardcode to local API
+    api_base = "http://localhost:8000"  # Hardcode to local API
     article_count = st.slider("Number of articles to analyze", 3, 15, 10)
 
     st.subheader("About")
@@ -80,16 +80,20 @@ st.markdown('<p class="main-header">📰 News Summarization and Sentiment Analys
 st.markdown('<p class="sub-header">Extract insights from news articles with AI-powered analysis</p>',
             unsafe_allow_html=True)
 
-# Company selection
-company_list = ["Tesla", "Apple", "Microsoft",
-                "Google", "Amazon", "Meta", "Netflix", "Nvidia"]
+# Company selection, backed by the company registry
+registry = st.cache_resource(show_spinner=False)(get_registry)()
 col1, col2 = st.columns([3, 1])
 
 with col1:
     company_selection = st.radio("Choose company selection method:", [
                                  "From list", "Custom entry"])
     if company_selection == "From list":
+        search = st.text_input("Search companies by name or ticker", "")
+        matches = registry.complete(search, limit=20) if search else None
+        company_list = [entry["Name"] for entry in matches] if matches is not None else registry.names()
         company_name = st.selectbox("Select a company", company_list)
+        if search and not company_list:
+            st.caption("No matching company, try a custom entry")
     else:
         company_name = st.text_input("Enter company name", "")
 
@@ -112,236 +116,214 @@ analyze_button = st.button(
 # Create placeholder for results
 results_placeholder = st.empty()
 
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_analysis(company, count, _on_progress=None):
+    """
+    Run the analysis as an API job once per (company, count), reruns reuse the result.
+
+    The job is long-polled, so slow pipelines are not cut off by an HTTP timeout.
+    `_on_progress` receives the per-stage progress after every update.
+    """
+    response = requests.post(
+        f"{api_base}/jobs",
+        json={"company_name": company, "article_count": count},
+        timeout=30
+    )
+    response.raise_for_status()
+    job = response.json()
+
+    deadline = time.monotonic() + 600
+    while job["Status"] not in ("succeeded", "failed"):
+        if time.monotonic() > deadline:
+            raise TimeoutError("The analysis is taking too long, please try again later")
+        response = requests.get(
+            f"{api_base}/jobs/{job['Job ID']}",
+            params={"wait": 25, "since": job["Version"]},
+            timeout=35
+        )
+        response.raise_for_status()
+        job = response.json()
+        if _on_progress:
+            _on_progress(job["Progress"])
+
+    if job["Status"] == "failed":
+        raise RuntimeError(job["Error"]["Detail"])
+    return job["Result"]
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_views(company, count):
+    """Derive tables, chart data and decoded audio from the cached response"""
+    data = fetch_analysis(company, count)
+    comparative = data["Comparative Sentiment Score"]
+
+    # Table of articles
+    articles_table = pd.DataFrame([{
+        "Index": i+1,
+        "Title": article["Title"],
+        "Sentiment": article["Sentiment"],
+        "Topics": ", ".join(article["Topics"]) if "Topics" in article else "N/A"
+    } for i, article in enumerate(data["Articles"])])
+
+    # Sentiment and topic counts come precomputed from the API
+    sentiment_chart = pd.DataFrame(
+        {"Count": comparative["Sentiment Distribution"]})
+    topic_chart = pd.DataFrame(
+        {"Frequency": comparative.get("Topic Frequency", {})})
+
+    return {
+        "articles_table": articles_table,
+        "sentiment_chart": sentiment_chart,
+        "topic_chart": topic_chart,
+        "audio": base64.b64decode(data["Audio"]),
+    }
+
+
 if analyze_button:
     # Display progress
     progress_bar = st.progress(0)
     status_text = st.empty()
 
-    status_text.text("Fetching news articles...")
+    status_text.text("Fetching and analyzing news articles...")
     progress_bar.progress(10)
-    time.sleep(0.5)
 
-    try:
-        # Call the API endpoint
-        response = requests.post(
-            api_endpoint,
-            json={"company_name": company_name,
-                  "article_count": article_count},
-            timeout=30
-        )
+    def show_progress(stages):
+        done = [stage for stage, state in stages.items() if state in ("done", "cached")]
+        running = [stage for stage, state in stages.items() if state == "running"]
+        progress_bar.progress(10 + int(90 * len(done) / len(stages)))
+        if running:
+            status_text.text(f"Running: {running[0].replace('_', ' ')}...")
 
-        progress_bar.progress(50)
-        status_text.text("Analyzing sentiment and generating insights...")
-        time.sleep(0.5)
-
-        if response.status_code == 200:
-            data = response.json()
-
-            progress_bar.progress(80)
-            status_text.text("Preparing results...")
-            time.sleep(0.5)
-
-            # Clear progress indicators
-            progress_bar.progress(100)
-            status_text.empty()
-            progress_bar.empty()
-
-            # Display results in a visually appealing format
-            with results_placeholder.container():
-                st.header(f"📊 Analysis Results for {data['Company']}")
-
-                # Summary of findings
-                st.subheader("Summary")
-                st.info(data["Final Sentiment Analysis"])
-
-                # Create tabs for different sections
-                tab1, tab2, tab3, tab4 = st.tabs(
-                    ["News Articles", "Sentiment Analysis", "Topic Analysis", "Hindi Summary"])
-
-                with tab1:
-                    # Articles in a more structured format
-                    st.subheader("News Articles Analysis")
-
-                    # Create a DataFrame for better visualization
-                    articles_data = []
-                    for i, article in enumerate(data["Articles"]):
-                        articles_data.append({
-                            "Index": i+1,
-                            "Title": article["Title"],
-                            "Sentiment": article["Sentiment"],
-                            "Topics": ", ".join(article["Topics"]) if "Topics" in article else "N/A"
-                        })
-
-                    # Convert to DataFrame and display as a table
-                    df_articles = pd.DataFrame(articles_data)
-                    st.dataframe(df_articles, use_container_width=True)
-
-                    # Display a few articles in detail
-                    st.subheader("Article Details")
-                    # Show only first 3 articles
-                    for i, article in enumerate(data["Articles"][:3]):
-                        with st.expander(f"Article {i+1}: {article['Title']}"):
-                            # Apply sentiment-based styling
-                            sentiment_class = ""
-                            if article["Sentiment"] == "Positive":
-                                sentiment_class = "sentiment-positive"
-                            elif article["Sentiment"] == "Negative":
-                                sentiment_class = "sentiment-negative"
-                            else:
-                                sentiment_class = "sentiment-neutral"
-
-                            st.markdown(f"**Summary:** {article['Summary']}")
-                            st.markdown(
-                                f"**Sentiment:** <span class='{sentiment_class}'>{article['Sentiment']}</span>", unsafe_allow_html=True)
-                            st.markdown(
-                                f"**Topics:** {', '.join(article['Topics']) if 'Topics' in article else 'N/A'}")
-                            if "URL" in article and article["URL"]:
-                                st.markdown(
-                                    f"[Read full article]({article['URL']})")
-
-                with tab2:
-                    # Sentiment analysis visualization
-                    st.subheader("Sentiment Distribution")
-
-                    # Get sentiment distribution
-                    sentiment_dist = data["Comparative Sentiment Score"]["Sentiment Distribution"]
-
-                    # Create DataFrame for visualization
-                    df_sentiment = pd.DataFrame({
-                        "Sentiment": list(sentiment_dist.keys()),
-                        "Count": list(sentiment_dist.values())
-                    })
-
-                    # Create a bar chart
-                    fig, ax = plt.subplots(figsize=(8, 5))
-                    bars = ax.bar(
-                        df_sentiment["Sentiment"],
-                        df_sentiment["Count"],
-                        color=["#2E7D32", "#C62828", "#757575"]
-                    )
-
-                    # Add labels and title
-                    ax.set_title(
-                        f"Sentiment Distribution for {data['Company']}", fontsize=14)
-                    ax.set_xlabel("Sentiment", fontsize=12)
-                    ax.set_ylabel("Number of Articles", fontsize=12)
-
-                    # Add values on top of bars
-                    for bar in bars:
-                        height = bar.get_height()
-                        ax.annotate(f"{height}",
-                                    xy=(bar.get_x() + bar.get_width() / 2, height),
-                                    xytext=(0, 3),
-                                    textcoords="offset points",
-                                    ha="center", va="bottom", fontsize=12)
-
-                    st.pyplot(fig)
-
-                    # Show sentiment comparisons
-                    st.subheader("Comparative Analysis")
-
-                    for i, comparison in enumerate(data["Comparative Sentiment Score"]["Coverage Differences"]):
-                        st.markdown(
-                            f"**Comparison {i+1}:** {comparison['Comparison']}")
-                        st.markdown(f"**Impact:** {comparison['Impact']}")
-
-                with tab3:
-                    # Topic analysis
-                    st.subheader("Topic Distribution")
-
-                    # Extract all topics
-                    all_topics = []
-                    for article in data["Articles"]:
-                        if "Topics" in article:
-                            all_topics.extend(article["Topics"])
-
-                    # Count topic frequencies
-                    topic_counts = {}
-                    for topic in all_topics:
-                        if topic in topic_counts:
-                            topic_counts[topic] += 1
-                        else:
-                            topic_counts[topic] = 1
-
-                    # Convert to DataFrame
-                    df_topics = pd.DataFrame({
-                        "Topic": list(topic_counts.keys()),
-                        "Frequency": list(topic_counts.values())
-                    }).sort_values(by="Frequency", ascending=False)
-
-                    # Plot horizontal bar chart for topics
-                    fig, ax = plt.subplots(figsize=(10, 6))
-                    bars = ax.barh(
-                        df_topics["Topic"], df_topics["Frequency"], color="#1E88E5")
-
-                    # Add labels and title
-                    ax.set_title(
-                        f"Topic Distribution in {data['Company']} News", fontsize=14)
-                    ax.set_xlabel("Number of Articles", fontsize=12)
-                    ax.set_ylabel("Topics", fontsize=12)
-
-                    # Add values to the right of bars
-                    for bar in bars:
-                        width = bar.get_width()
-                        ax.annotate(f"{width}",
-                                    xy=(width, bar.get_y() +
-                                        bar.get_height() / 2),
-                                    xytext=(3, 0),
-                                    textcoords="offset points",
-                                    ha="left", va="center", fontsize=10)
-
-                    st.pyplot(fig)
-
-                    # Show common topics
-                    st.subheader("Topic Overlap Analysis")
-
-                    common_topics = data["Comparative Sentiment Score"]["Topic Overlap"]["Common Topics"]
-
-                    if common_topics and common_topics[0] != "No common topics found":
-                        st.markdown("**Common Topics Across Articles:**")
-                        for topic in common_topics:
-                            st.markdown(f"- {topic}")
-                    else:
-                        st.markdown(
-                            "No common topics were found across articles.")
-
-                with tab4:
-                    # Hindi summary and audio
-                    st.subheader("Summary in Hindi")
-
-                    # Display Hindi text
-                    st.markdown(f"**Hindi Summary:**")
-                    st.info(data["Hindi Summary"])
+    try:
+        fetch_analysis(company_name, article_count, _on_progress=show_progress)
+        # Remember the analysis so later widget interactions re-render it from cache
+        st.session_state["analysis"] = (company_name, article_count)
 
-                    # Display audio player
-                    st.markdown("**Listen to Summary:**")
+    except requests.exceptions.ConnectionError:
+        st.error(
+            "❌ Unable to connect to the API. Please check if the API server is running and the endpoint is correct.")
 
-                    # Decode base64 audio data
-                    audio_data = base64.b64decode(data["Audio"])
+    except Exception as e:
+        st.error(f"❌ An error occurred: {str(e)}")
 
-                    # Create a bytes buffer
-                    audio_bytes = io.BytesIO(audio_data)
+    finally:
+        # Clear progress indicators
+        status_text.empty()
+        progress_bar.empty()
 
-                    # Create an audio player
-                    st.audio(audio_bytes, format="audio/wav")
+if "analysis" in st.session_state:
+    try:
+        data = fetch_analysis(*st.session_state["analysis"])
+        views = build_views(*st.session_state["analysis"])
+
+        # Display results in a visually appealing format
+        with results_placeholder.container():
+            st.header(f"📊 Analysis Results for {data['Company']}")
+
+            # Summary of findings
+            st.subheader("Summary")
+            st.info(data["Final Sentiment Analysis"])
+
+            # Create tabs for different sections
+            tab1, tab2, tab3, tab4 = st.tabs(
+                ["News Articles", "Sentiment Analysis", "Topic Analysis", "Hindi Summary"])
+
+            with tab1:
+                # Articles in a more structured format
+                st.subheader("News Articles Analysis")
+                st.dataframe(views["articles_table"], use_container_width=True)
+
+                # Display a few articles in detail
+                st.subheader("Article Details")
+                # Show only first 3 articles
+                for i, article in enumerate(data["Articles"][:3]):
+                    with st.expander(f"Article {i+1}: {article['Title']}"):
+                        # Apply sentiment-based styling
+                        sentiment_class = ""
+                        if article["Sentiment"] == "Positive":
+                            sentiment_class = "sentiment-positive"
+                        elif article["Sentiment"] == "Negative":
+                            sentiment_class = "sentiment-negative"
+                        else:
+                            sentiment_class = "sentiment-neutral"
 
-                    # Add download button for audio
-                    st.download_button(
-                        label="Download Audio",
-                        data=audio_data,
-                        file_name=f"{data['Company']}_hindi_summary.wav",
-                        mime="audio/wav"
-                    )
+                        st.markdown(f"**Summary:** {article['Summary']}")
+                        st.markdown(
+                            f"**Sentiment:** <span class='{sentiment_class}'>{article['Sentiment']}</span>", unsafe_allow_html=True)
+                        st.markdown(
+                            f"**Topics:** {', '.join(article['Topics']) if 'Topics' in article else 'N/A'}")
+                        if "URL" in article and article["URL"]:
+                            st.markdown(
+                                f"[Read full article]({article['URL']})")
+
+            with tab2:
+                # Sentiment analysis visualization
+                st.subheader("Sentiment Distribution")
+
+                # Native chart, no figure is rendered server-side
+                st.bar_chart(views["sentiment_chart"], y="Count",
+                             color="#1E88E5")
+
+                # Show sentiment comparisons
+                st.subheader("Comparative Analysis")
+
+                for i, comparison in enumerate(data["Comparative Sentiment Score"]["Coverage Differences"]):
+                    st.markdown(
+                        f"**Comparison {i+1}:** {comparison['Comparison']}")
+                    st.markdown(f"**Impact:** {comparison['Impact']}")
+
+            with tab3:
+                # Topic analysis
+                st.subheader("Topic Distribution")
+                st.bar_chart(views["topic_chart"], y="Frequency",
+                             color="#1E88E5")
+
+                # Show common topics
+                st.subheader("Topic Overlap Analysis")
+
+                common_topics = data["Comparative Sentiment Score"]["Topic Overlap"]["Common Topics"]
+
+                if common_topics and common_topics[0] != "No common topics found":
+                    st.markdown("**Common Topics Across Articles:**")
+                    for topic in common_topics:
+                        st.markdown(f"- {topic}")
+                else:
+                    st.markdown(
+                        "No common topics were found across articles.")
+
+            with tab4:
+                # Hindi summary and audio
+                st.subheader("Summary in Hindi")
+
+                # Display Hindi text
+                st.markdown(f"**Hindi Summary:**")
+                st.info(data["Hindi Summary"])
+
+                # Display audio player
+                st.markdown("**Listen to Summary:**")
+
+                audio_data = views["audio"]
+                audio_format = data.get("Audio Format", "mp3")
+                audio_mime = data.get("Audio MIME Type", "audio/mpeg")
+
+                # Create an audio player
+                st.audio(io.BytesIO(audio_data), format=audio_mime)
+
+                # Add download button for audio
+                extension = "ogg" if audio_format == "opus" else audio_format
+                st.download_button(
+                    label="Download Audio",
+                    data=audio_data,
+                    file_name=f"{data['Company']}_hindi_summary.{extension}",
+                    mime=audio_mime
+                )
 
     except requests.exceptions.ConnectionError:
-        progress_bar.empty()
-        status_text.empty()
         st.error(
             "❌ Unable to connect to the API. Please check if the API server is running and the endpoint is correct.")
 
     except Exception as e:
-        progress_bar.empty()
-        status_text.empty()
         st.error(f"❌ An error occurred: {str(e)}")
 
 # Footer
@@ -0,0 +1,198 @@
+"""
+Score a news archive offline with the same logic as the API.
+
+Reads JSONL (optionally gzipped) in chunks, scores every row with clean_text,
+analyze_sentiment and extract_topics on a process pool, and writes the rows in
+input order to JSONL or Parquet. Progress is checkpointed after every chunk so
+an interrupted run can be resumed with --resume.
+
+Usage:
+    python -m backfill archive.jsonl scored.jsonl --workers 8 --chunk-size 2000
+    python -m backfill archive.jsonl.gz scored_parquet --format parquet --resume
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from utils import analyze_sentiment, clean_text, extract_topics
+
+
+def score_chunk(rows, text_field):
+    """
+    Score one chunk of archive rows.
+
+    Args:
+        rows (list): Raw JSONL lines
+        text_field (str): Field holding the text to score
+
+    Returns:
+        list: Scored rows as JSON strings, in input order
+    """
+    scored = []
+    for line in rows:
+        row = json.loads(line)
+        text = clean_text(row.get(text_field) or "")
+        row["Sentiment"] = analyze_sentiment(text) if text else "Neutral"
+        row["Topics"] = extract_topics(text)
+        scored.append(json.dumps(row, ensure_ascii=False))
+    return scored
+
+
+def read_chunks(path, chunk_size, skip_rows=0):
+    """Yield lists of non-empty lines from a JSONL file, skipping rows already done"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        lines = (line for line in f if line.strip())
+        for _ in itertools.islice(lines, skip_rows):
+            pass
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+class JsonlWriter:
+    """Appends scored rows to a JSONL file, truncating to the checkpointed size on resume"""
+
+    def __init__(self, path, offset=0):
+        mode = "r+b" if offset and os.path.exists(path) else "wb"
+        self.file = open(path, mode)
+        self.file.seek(offset)
+        self.file.truncate()
+
+    def write(self, rows, chunk_index):
+        self.file.write(("\n".join(rows) + "\n").encode("utf-8"))
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Writes one Parquet part file per chunk into an output directory"""
+
+    def __init__(self, path, offset=0):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow, install it with `pip install pyarrow`")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, rows, chunk_index):
+        table = self.pa.Table.from_pylist([json.loads(row) for row in rows])
+        # Write under a temporary name so a crash never leaves a half-written part
+        part = os.path.join(self.path, f"part-{chunk_index:06d}.parquet")
+        self.pq.write_table(table, part + ".tmp")
+        os.replace(part + ".tmp", part)
+        return 0
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"rows": 0, "chunks": 0, "offset": 0}
+
+
+def save_checkpoint(path, state):
+    """Write the checkpoint atomically so it always matches what was written"""
+    if not path:
+        return
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def run_backfill(input_path, output_path, output_format="jsonl", workers=None, chunk_size=1000,
+                 text_field="summary", checkpoint_path=None, resume=False, report_every=10.0):
+    """
+    Score an archive and write the results in input order.
+
+    At most two chunks per worker are in flight at any time, so memory stays
+    bounded regardless of the archive size.
+
+    Returns:
+        int: Number of rows written by this run
+    """
+    workers = workers or os.cpu_count() or 1
+    state = load_checkpoint(checkpoint_path) if resume else {"rows": 0, "chunks": 0, "offset": 0}
+    writer_class = ParquetWriter if output_format == "parquet" else JsonlWriter
+    writer = writer_class(output_path, state["offset"])
+
+    if state["rows"]:
+        print(f"Resuming after {state['rows']} rows", file=sys.stderr)
+
+    started = time.monotonic()
+    last_report = started
+    written = 0
+    pending = deque()
+    chunks = read_chunks(input_path, chunk_size, state["rows"])
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    pending.append(pool.submit(score_chunk, chunk, text_field))
+                    if len(pending) < workers * 2:
+                        continue
+
+                # Drain the oldest chunks first to keep the output in input order
+                while pending and (chunk is None or len(pending) >= workers * 2):
+                    rows = pending.popleft().result()
+                    state["offset"] = writer.write(rows, state["chunks"])
+                    state["rows"] += len(rows)
+                    state["chunks"] += 1
+                    written += len(rows)
+                    save_checkpoint(checkpoint_path, state)
+
+                    now = time.monotonic()
+                    if now - last_report >= report_every:
+                        print(f"{state['rows']} rows, {written / (now - started):.0f} rows/sec",
+                              file=sys.stderr)
+                        last_report = now
+    finally:
+        writer.close()
+
+    elapsed = time.monotonic() - started
+    rate = written / elapsed if elapsed > 0 else 0
+    print(f"Done: {written} rows in {elapsed:.1f}s ({rate:.0f} rows/sec, {workers} workers)",
+          file=sys.stderr)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m backfill",
+        description="Score a JSONL news archive with the API's sentiment and topic logic")
+    parser.add_argument("input", help="Input JSONL file, optionally .gz")
+    parser.add_argument("output", help="Output JSONL file, or directory for Parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per chunk")
+    parser.add_argument("--text-field", default="summary", help="Field holding the text to score")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file (default: <output>.checkpoint.json)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or args.output.rstrip("/") + ".checkpoint.json"
+    run_backfill(args.input, args.output, args.format, args.workers, args.chunk_size,
+                 args.text_field, checkpoint, args.resume)
+
+
+if __name__ == "__main__":
+    main()
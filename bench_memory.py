@@ -0,0 +1,148 @@
+"""
+Peak memory benchmark for the /analyze pipeline.
+
+Runs `--requests` uncached analyses at once against a local stand-in for
+Google News and MyMemory, with gTTS replaced by a fixed-size clip, and reports
+the peak RSS growth per request. With `--trace` the peak of the allocations
+traced by tracemalloc is reported as well, at several times the run time. A
+single request is then run with per-stage memory tracking to show where the
+memory goes.
+
+Usage:
+    python bench_memory.py --requests 100 --articles 20 --audio-kb 200
+    python bench_memory.py --requests 20 --trace
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def news_page(query, start, results, filler_kb):
+    """A results page shaped like Google's, padded with the markup real pages carry"""
+    items = []
+    for i in range(results):
+        n = start + i
+        items.append(
+            f'<div class="SoaBEf"><a href="https://example.com/{n}">'
+            f'<div role="heading">{query} headline number {n} beats expectations</div>'
+            f'<div class="GI74Re">Analysts say {query} had a strong quarter with record growth '
+            f'and rising profit, while some warn of weak demand and falling margins ({n}).</div>'
+            f'</a></div>')
+    filler = '<div class="pad"><span>x</span></div>' * (filler_kb * 1024 // 36)
+    return f"<html><body>{filler}{''.join(items)}{filler}</body></html>".encode("utf-8")
+
+
+def start_upstreams(results, filler_kb):
+    """Serve Google News and MyMemory stand-ins on a local port"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if url.path == "/translate":
+                body = json.dumps({"responseStatus": 200,
+                                   "responseData": {"translatedText": "हिंदी सारांश " * 20}}).encode("utf-8")
+            else:
+                query = params.get("q", [""])[0].replace(" news", "")
+                body = news_page(query, int(params.get("start", ["0"])[0]), results, filler_kb)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # Every request connects at once, the default backlog of 5 would drop connections
+        request_queue_size = 1024
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def peak_rss_kb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="Concurrent requests")
+    parser.add_argument("--articles", type=int, default=20, help="Articles per request")
+    parser.add_argument("--results", type=int, default=8, help="Articles per Google page")
+    parser.add_argument("--page-kb", type=int, default=150, help="Markup padding per Google page")
+    parser.add_argument("--audio-kb", type=int, default=200, help="Size of the synthesized clip")
+    parser.add_argument("--trace", action="store_true", help="Also trace allocations with tracemalloc")
+    args = parser.parse_args()
+
+    base = start_upstreams(args.results, args.page_kb // 2)
+    # The upstreams have to be configured before utils reads them
+    os.environ.pop("NEWS_API_KEY", None)
+    os.environ["GOOGLE_NEWS_URL"] = base + "/search"
+    os.environ["MYMEMORY_URL"] = base + "/translate"
+    # Under tracemalloc a hundred parses take a while, none of them should time out
+    os.environ["UPSTREAM_TIMEOUT"] = "600"
+    for quota in ("GOOGLE_QUOTA", "MYMEMORY_QUOTA", "GTTS_QUOTA"):
+        os.environ[quota] = "100000"
+
+    import api
+    import utils
+    from memory import memory_tracker
+
+    clip = os.urandom(args.audio_kb * 1024)
+
+    class FixedTTS:
+        def __init__(self, text, lang, slow):
+            pass
+
+        def write_to_fp(self, fp):
+            fp.write(clip)
+
+    utils.gTTS = FixedTTS
+    # Nothing is gained by pacing requests to a local server
+    utils.time.sleep = lambda seconds: None
+
+    def analyze(i):
+        return api.get_cached_analysis(f"Company{i}", args.articles, refresh=True)
+
+    # Load the lexicon and start the sentiment batcher outside the measurement
+    analyze(-1)
+
+    if args.trace:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    rss_before = peak_rss_kb()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.requests) as pool:
+        entries = list(pool.map(analyze, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    rss_growth = peak_rss_kb() - rss_before
+    body_kb = sum(len(entry.body) for entry in entries) / len(entries) / 1024
+    del entries
+
+    print(f"{args.requests} concurrent requests in {elapsed:.1f} s, response body {body_kb:.0f} KB")
+    print(f"peak RSS growth per request {rss_growth / args.requests:>6.0f} KB")
+    if args.trace:
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        print(f"peak traced per request {peak / args.requests / 1024:>10.0f} KB")
+
+    # One request on its own, so the per-stage figures are not blended
+    memory_tracker.enabled = True
+    analyze(args.requests)
+    print(f"\n{'stage':<16}{'growth KB':>12}{'peak KB':>12}")
+    for stage, figures in memory_tracker.snapshot()["Stages"].items():
+        print(f"{stage:<16}{figures['Max Growth KB']:>12.0f}{figures['Max Peak KB']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput and latency benchmark for the sentiment backends.
+
+Simulates concurrent /analyze requests, each scoring `--articles` texts, and
+compares per-article TextBlob scoring with the micro-batched backend.
+
+Usage:
+    python bench_sentiment.py --requests 200 --concurrency 32
+    SENTIMENT_MODEL_PATH=model.onnx SENTIMENT_TOKENIZER_PATH=tokenizer.json \
+        python bench_sentiment.py --backend onnx --batch-size 64 --wait-ms 5
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sentiment import MicroBatcher, TextBlobBackend, create_backend
+from utils import generate_mock_articles
+
+
+def sample_texts(count):
+    """Article summaries shaped like the ones the API scores"""
+    articles = generate_mock_articles("Acme", 20)
+    return [random.choice(articles)["Summary"] for _ in range(count)]
+
+
+def run(label, score, requests, concurrency, articles):
+    """Fire `requests` requests from `concurrency` threads and report latency and throughput"""
+    payloads = [sample_texts(articles) for _ in range(requests)]
+    latencies = []
+
+    def one_request(texts):
+        started = time.perf_counter()
+        score(texts)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, payloads))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<28} {requests * articles / elapsed:>10.0f} texts/s "
+          f"{p50:>9.1f} ms p50 {p99:>9.1f} ms p99")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="textblob", help="Backend to batch: textblob or onnx")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--articles", type=int, default=10, help="Texts per request")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="Inference threads")
+    args = parser.parse_args()
+
+    baseline = TextBlobBackend()
+    # Warm up TextBlob's lexicon so loading it is not timed
+    baseline.predict_batch(sample_texts(1))
+
+    run("textblob, per article", baseline.predict_batch,
+        args.requests, args.concurrency, args.articles)
+
+    backend = create_backend(args.backend)
+    backend.predict_batch(sample_texts(1))
+    # Force batching even for TextBlob so its effect can be measured
+    backend.batched = True
+    batcher = MicroBatcher(backend, args.batch_size, args.wait_ms, args.workers)
+    run(f"{backend.name}, micro-batched", batcher.predict,
+        args.requests, args.concurrency, args.articles)
+    print(batcher.stats())
+
+
+if __name__ == "__main__":
+    main()
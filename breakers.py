@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+
+# Consecutive failures that open a circuit
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "3"))
+# Seconds an open circuit waits before letting a probe call through
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+
+# Response header reporting the breaker states at the time a response was served
+BREAKER_HEADER = "X-Circuit-Breakers"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker guarding calls to one upstream service.
+
+    The circuit opens after `failure_threshold` consecutive failures, and while
+    it is open allow() returns False so callers go straight to their fallback.
+    After `reset_timeout` seconds a single probe call is let through (half-open);
+    its outcome closes the circuit again or reopens it for another period.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Check whether a call may be made to the upstream"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._probe_started = None
+
+            # Half-open: only one probe at a time, unless the last one never reported back
+            now = time.monotonic()
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+            return True
+
+    def release(self):
+        """Give back a half-open probe that was allowed but never sent, e.g. for lack of quota"""
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_started = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_started = None
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.trips += 1
+
+    def reset(self):
+        """Force the circuit closed, e.g. from the admin endpoint"""
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_started = None
+
+    def snapshot(self):
+        with self._lock:
+            return {"State": self.state, "Consecutive Failures": self.failures, "Trips": self.trips}
+
+
+# One breaker per upstream used by utils
+breakers = {name: CircuitBreaker(name) for name in ("newsapi", "google", "mymemory", "gtts")}
+
+
+def breaker_states():
+    """State and trip counts of every upstream breaker"""
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+def breaker_header():
+    """Breaker states as compact JSON, for the BREAKER_HEADER response header"""
+    return json.dumps(breaker_states(), separators=(",", ":"))
@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# How long a cached response is served without re-checking the article set
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+# Maximum number of responses kept in memory
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+# Raw bytes base64-encoded at a time, a multiple of 3 so chunks need no padding
+BASE64_CHUNK_SIZE = 3 * 16 * 1024
+
+
+def article_fingerprint(articles):
+    """
+    Compute a stable fingerprint of an article set.
+
+    Only the fetched fields are hashed, so the fingerprint can be taken before
+    sentiment and topics are added to the articles.
+
+    Args:
+        articles (list): List of article dictionaries
+
+    Returns:
+        str: Hex digest identifying the article set
+    """
+    digest = hashlib.sha256()
+    for article in articles:
+        for field in ("Title", "Summary", "URL"):
+            digest.update(str(article.get(field, "")).encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+
+def make_etag(body):
+    """Build a strong ETag from the serialized response body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses the weak comparison, so ignore any W/ prefix
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def serialize_response(response):
+    """
+    Encode a response as UTF-8 JSON.
+
+    Top-level bytes values (the audio) are base64-encoded chunk by chunk straight
+    into the body, so neither a full base64 copy nor a str of it is ever built.
+    The output is identical to json.dumps of the base64-encoded response.
+
+    Returns:
+        tuple: (body bytes, {key: (start, end)} offsets of the base64 values in the body)
+    """
+    body = io.BytesIO()
+    spans = {}
+    body.write(b"{")
+    for i, (key, value) in enumerate(response.items()):
+        if i:
+            body.write(b", ")
+        body.write(json.dumps(key, ensure_ascii=False).encode("utf-8"))
+        body.write(b": ")
+        if isinstance(value, (bytes, bytearray)):
+            body.write(b'"')
+            start = body.tell()
+            view = memoryview(value)
+            for offset in range(0, len(view), BASE64_CHUNK_SIZE):
+                body.write(base64.b64encode(view[offset:offset + BASE64_CHUNK_SIZE]))
+            spans[key] = (start, body.tell())
+            body.write(b'"')
+        else:
+            body.write(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    body.write(b"}")
+    return body.getvalue(), spans
+
+
+class CachedResponse:
+    """A serialized response together with the article set it was built from"""
+
+    def __init__(self, company, article_count, fingerprint, response):
+        self.company = company
+        self.article_count = article_count
+        self.fingerprint = fingerprint
+        self.body, self._spans = serialize_response(response)
+        self.etag = make_etag(self.body)
+        self.checked_at = time.monotonic()
+        # Cut down to fit a latency budget, never stored or reused
+        self.degraded = "Degraded Stages" in response
+        self._audio_format = response.get("Audio Format")
+        self._audio = None
+
+    def age(self):
+        """Seconds since the article set was last confirmed"""
+        return time.monotonic() - self.checked_at
+
+    def is_fresh(self):
+        return self.age() < RESPONSE_CACHE_TTL
+
+    def audio(self):
+        """Raw audio bytes and format of the response, decoded once on first use"""
+        if self._audio is None:
+            if "Audio" in self._spans:
+                # Decode the base64 in place instead of parsing the whole body
+                start, end = self._spans["Audio"]
+                self._audio = (base64.b64decode(memoryview(self.body)[start:end]), self._audio_format)
+            else:
+                response = json.loads(self.body)
+                self._audio = (base64.b64decode(response["Audio"]), response["Audio Format"])
+        return self._audio
+
+    def max_age(self):
+        """Remaining freshness in seconds, for the Cache-Control header"""
+        return max(0, int(RESPONSE_CACHE_TTL - self.age()))
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of assembled /analyze responses.
+
+    Entries are keyed by (company, article_count, pipeline version, fields,
+    audio format) and remember the fingerprint of the article set they were
+    built from. Storing a response for a new article set drops every entry for
+    the same company and article count that was built from a different set.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def touch(self, key):
+        """Mark an entry as confirmed against the current article set"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.checked_at = time.monotonic()
+            return entry
+
+    def store(self, key, entry):
+        with self._lock:
+            # Invalidate responses built from an older article set
+            stale = [k for k, e in self._entries.items()
+                     if e.company == entry.company
+                     and e.article_count == entry.article_count
+                     and e.fingerprint != entry.fingerprint]
+            for k in stale:
+                del self._entries[k]
+
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def invalidate(self, company=None):
+        """Drop cached responses for one company, or all of them"""
+        with self._lock:
+            if company is None:
+                self._entries.clear()
+                return
+            for k in [k for k, e in self._entries.items() if e.company == company]:
+                del self._entries[k]
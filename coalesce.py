@@ -0,0 +1,221 @@
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+# How long to wait for more companies before sending a combined query, 0 disables coalescing
+NEWSAPI_COALESCE_WINDOW_MS = float(os.environ.get("NEWSAPI_COALESCE_WINDOW_MS", "20"))
+# NewsAPI rejects `q` values longer than 500 characters and pages larger than 100 articles
+NEWSAPI_MAX_QUERY_LENGTH = int(os.environ.get("NEWSAPI_MAX_QUERY_LENGTH", "500"))
+NEWSAPI_MAX_PAGE_SIZE = int(os.environ.get("NEWSAPI_MAX_PAGE_SIZE", "100"))
+
+
+def build_query(companies):
+    """NewsAPI `q` value for one or more companies"""
+    if len(companies) == 1:
+        return companies[0]
+    return " OR ".join(f'"{company}"' for company in companies)
+
+
+def plan_queries(wanted, max_query_length=NEWSAPI_MAX_QUERY_LENGTH, max_page_size=NEWSAPI_MAX_PAGE_SIZE):
+    """
+    Pack companies into as few NewsAPI queries as the limits allow.
+
+    Companies are added to the current query in order until either the query
+    string or the combined article count would exceed the limits.
+
+    Args:
+        wanted (dict): Company name -> number of articles requested
+        max_query_length (int): Longest allowed `q` value
+        max_page_size (int): Most articles one query can return
+
+    Returns:
+        list: Lists of company names, one per query
+    """
+    groups = []
+    group, group_articles = [], 0
+    for company, count in wanted.items():
+        count = min(count, max_page_size)
+        if group and (len(build_query(group + [company])) > max_query_length
+                      or group_articles + count > max_page_size):
+            groups.append(group)
+            group, group_articles = [], 0
+        group.append(company)
+        group_articles += count
+    if group:
+        groups.append(group)
+    return groups
+
+
+def company_pattern(company):
+    """Case-insensitive whole-word match for a company name"""
+    return re.compile(r"(?<!\w)" + re.escape(company) + r"(?!\w)", re.IGNORECASE)
+
+
+def demultiplex(articles, companies):
+    """
+    Assign the articles of a combined query back to the companies they mention.
+
+    An article is matched on its title, description and content, and goes to
+    every company it mentions, in the order NewsAPI returned them.
+
+    Returns:
+        dict: Company name -> list of raw NewsAPI articles
+    """
+    patterns = {company: company_pattern(company) for company in companies}
+    matched = {company: [] for company in companies}
+    for article in articles:
+        text = " ".join(article.get(field) or "" for field in ("title", "description", "content"))
+        for company, pattern in patterns.items():
+            if pattern.search(text):
+                matched[company].append(article)
+    return matched
+
+
+class QueryCoalescer:
+    """
+    Combines NewsAPI lookups for different companies into shared queries.
+
+    Callers block in `fetch` while a collector thread gathers the companies
+    requested within `window_ms`, plans the fewest queries for them and splits
+    the results locally. Companies a combined query left short of articles get
+    a follow-up query of their own, unless the combined query already returned
+    everything NewsAPI had. Only lookups of the same priority share queries, so
+    each query spends quota at the priority of every caller it serves.
+
+    `search(query, page_size, priority)` performs one NewsAPI request and
+    returns the raw articles, or None if the request could not be made or failed.
+    """
+
+    def __init__(self, search, window_ms=NEWSAPI_COALESCE_WINDOW_MS,
+                 max_query_length=NEWSAPI_MAX_QUERY_LENGTH, max_page_size=NEWSAPI_MAX_PAGE_SIZE):
+        self.search = search
+        self.window = window_ms / 1000.0
+        self.max_query_length = max_query_length
+        self.max_page_size = max_page_size
+        self.queries = 0
+        self.follow_ups = 0
+        self.companies = 0
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="newsapi")
+        self._collector = None
+        self._lock = threading.Lock()
+
+    def fetch(self, company, count, priority=None, timeout=None, inline=False):
+        """
+        Raw NewsAPI articles for a company.
+
+        The lookup runs on the coalescer's threads, which do not see the caller's
+        context, so the caller's request priority is passed along explicitly and
+        its latency budget becomes `timeout`. With `inline` the lookup runs alone
+        on the calling thread instead, for requests that are being profiled.
+
+        Returns:
+            list: Up to `count` articles, or None if NewsAPI could not be queried
+
+        Raises:
+            concurrent.futures.TimeoutError: If the lookup took longer than `timeout` seconds
+        """
+        if inline or self.window <= 0:
+            return self._resolve({company: count}, priority)[company]
+
+        self._ensure_collector()
+        future = Future()
+        self._queue.put((company, count, priority, future))
+        return future.result(timeout=timeout)
+
+    def _ensure_collector(self):
+        with self._lock:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, daemon=True,
+                                                   name="newsapi-coalescer")
+                self._collector.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            by_priority = {}
+            for item in batch:
+                by_priority.setdefault(item[2], []).append(item)
+            for priority, items in by_priority.items():
+                self._executor.submit(self._run, items, priority)
+
+    def _run(self, batch, priority):
+        # Several callers asking for the same company share its lookup
+        wanted = {}
+        for company, count, _, _ in batch:
+            wanted[company] = max(count, wanted.get(company, 0))
+
+        try:
+            results = self._resolve(wanted, priority)
+        except Exception as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for company, count, _, future in batch:
+            articles = results[company]
+            future.set_result(articles[:count] if articles is not None else None)
+
+    def _query(self, companies, page_size, priority):
+        with self._lock:
+            self.queries += 1
+        return self.search(build_query(companies), page_size, priority)
+
+    def _resolve(self, wanted, priority=None):
+        results = {company: [] for company in wanted}
+        failed = set()
+        under_filled = []
+
+        for group in plan_queries(wanted, self.max_query_length, self.max_page_size):
+            if len(group) == 1:
+                page_size = min(wanted[group[0]], self.max_page_size)
+            else:
+                # A full page costs the same quota and leaves fewer companies short
+                page_size = self.max_page_size
+            articles = self._query(group, page_size, priority)
+            if articles is None:
+                failed.update(group)
+                continue
+
+            matched = demultiplex(articles, group) if len(group) > 1 else {group[0]: articles}
+            for company in group:
+                results[company] = matched[company][:wanted[company]]
+                # A short page means NewsAPI had nothing more for any company in the query
+                if len(group) > 1 and len(articles) >= page_size and len(results[company]) < wanted[company]:
+                    under_filled.append(company)
+
+        for company in under_filled:
+            with self._lock:
+                self.follow_ups += 1
+            articles = self._query([company], min(wanted[company], self.max_page_size), priority)
+            if articles is None:
+                continue
+            seen = {article.get("url") for article in results[company]}
+            for article in articles:
+                if len(results[company]) >= wanted[company]:
+                    break
+                if article.get("url") not in seen:
+                    seen.add(article.get("url"))
+                    results[company].append(article)
+
+        with self._lock:
+            self.companies += len(wanted)
+        return {company: None if company in failed else articles for company, articles in results.items()}
+
+    def stats(self):
+        return {"Companies": self.companies, "Queries": self.queries, "Follow-up Queries": self.follow_ups,
+                "Companies per Query": round(self.companies / self.queries, 2) if self.queries else 0}
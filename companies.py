@@ -0,0 +1,210 @@
+import bisect
+import csv
+import hashlib
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+
+
+# Ticker/alias file: CSV with name, ticker and "|"-separated aliases
+COMPANY_REGISTRY_PATH = os.environ.get(
+    "COMPANY_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "companies.csv"))
+# Compiled index, rebuilt whenever the registry file changes
+COMPANY_INDEX_DIR = os.environ.get("COMPANY_INDEX_DIR", tempfile.gettempdir())
+
+# Legal-form words dropped from the end of names, so "Tesla Inc" matches "Tesla"
+CORPORATE_SUFFIXES = {"inc", "incorporated", "corp", "corporation", "co", "company", "ltd",
+                      "limited", "plc", "llc", "holdings", "group", "sa", "ag", "nv"}
+
+INDEX_MAGIC = b"CIDX0002"
+# magic, key count, company count, source mtime (ns), source size
+INDEX_HEADER = struct.Struct("<8sIIqq")
+
+
+def normalize_company(name, strip_suffixes=True):
+    """
+    Normalize a company name for lookups.
+
+    Lowercases, drops punctuation other than "&" and, unless disabled, trailing
+    legal-form words ("Tesla, Inc." -> "tesla").
+    """
+    words = re.findall(r"[a-z0-9&]+", name.lower())
+    if strip_suffixes:
+        while len(words) > 1 and words[-1] in CORPORATE_SUFFIXES:
+            words.pop()
+    return " ".join(words)
+
+
+def build_index(source_path, index_path):
+    """
+    Compile the registry CSV into the binary index format.
+
+    The index holds every normalized key (name, ticker, alias) sorted by bytes
+    with the id of its company, and a table of canonical names and tickers, all
+    as offset arrays into string blobs so it can be searched in place.
+    """
+    companies = []
+    keys = {}
+    with open(source_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            if not name:
+                continue
+            ticker = (row.get("ticker") or "").strip()
+            company_id = len(companies)
+            companies.append(f"{name}\x1f{ticker}".encode("utf-8"))
+
+            aliases = [name, ticker] + (row.get("aliases") or "").split("|")
+            for alias in aliases:
+                key = normalize_company(alias).encode("utf-8")
+                # The first company to claim a key keeps it
+                if key and key not in keys:
+                    keys[key] = company_id
+
+    sorted_keys = sorted(keys)
+    stat = os.stat(source_path)
+
+    def offsets(blobs):
+        result, position = [], 0
+        for blob in blobs:
+            result.append(position)
+            position += len(blob)
+        result.append(position)
+        return result
+
+    key_offsets = offsets(sorted_keys)
+    name_offsets = offsets(companies)
+
+    # Write under a temporary name so concurrent workers never map a partial file
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(sorted_keys), len(companies),
+                                  stat.st_mtime_ns, stat.st_size))
+        f.write(struct.pack(f"<{len(key_offsets)}I", *key_offsets))
+        f.write(struct.pack(f"<{len(sorted_keys)}I", *(keys[key] for key in sorted_keys)))
+        f.write(struct.pack(f"<{len(name_offsets)}I", *name_offsets))
+        f.write(b"".join(sorted_keys))
+        f.write(b"".join(companies))
+    # mkstemp creates the file private, every worker needs to read it
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, index_path)
+
+
+class _KeyView:
+    """Sequence of the index keys, read straight from the mapped file for bisect"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def __len__(self):
+        return self.registry.key_count
+
+    def __getitem__(self, i):
+        return self.registry._key(i)
+
+
+class CompanyRegistry:
+    """
+    Read-only, memory-mapped index of company names, tickers and aliases.
+
+    Lookups binary-search the sorted key table inside the mapping, so nothing
+    is loaded into Python objects up front and every worker shares the pages.
+    """
+
+    def __init__(self, source_path=COMPANY_REGISTRY_PATH, index_dir=COMPANY_INDEX_DIR):
+        digest = hashlib.sha1(os.path.abspath(source_path).encode("utf-8")).hexdigest()[:12]
+        self.index_path = os.path.join(index_dir, f"companies-{digest}.idx")
+        if not self._index_current(source_path):
+            build_index(source_path, self.index_path)
+
+        with open(self.index_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        _, self.key_count, self.company_count, _, _ = INDEX_HEADER.unpack_from(self._mmap, 0)
+        position = INDEX_HEADER.size
+        self._key_offsets = view[position:position + 4 * (self.key_count + 1)].cast("I")
+        position += 4 * (self.key_count + 1)
+        self._key_ids = view[position:position + 4 * self.key_count].cast("I")
+        position += 4 * self.key_count
+        self._name_offsets = view[position:position + 4 * (self.company_count + 1)].cast("I")
+        position += 4 * (self.company_count + 1)
+        self._key_blob = position
+        self._name_blob = position + self._key_offsets[self.key_count]
+        self._keys = _KeyView(self)
+
+    def _index_current(self, source_path):
+        """Check whether the compiled index exists and matches the registry file"""
+        try:
+            stat = os.stat(source_path)
+            with open(self.index_path, "rb") as f:
+                header = f.read(INDEX_HEADER.size)
+            magic, _, _, mtime, size = INDEX_HEADER.unpack(header)
+        except (OSError, struct.error):
+            return False
+        return magic == INDEX_MAGIC and mtime == stat.st_mtime_ns and size == stat.st_size
+
+    def _key(self, i):
+        start = self._key_blob + self._key_offsets[i]
+        end = self._key_blob + self._key_offsets[i + 1]
+        return self._mmap[start:end]
+
+    def _company(self, company_id):
+        start = self._name_blob + self._name_offsets[company_id]
+        end = self._name_blob + self._name_offsets[company_id + 1]
+        name, ticker = self._mmap[start:end].decode("utf-8").split("\x1f")
+        return {"Name": name, "Ticker": ticker}
+
+    def lookup(self, name):
+        """Return the registry entry for a name, ticker or alias, or None"""
+        key = normalize_company(name).encode("utf-8")
+        i = bisect.bisect_left(self._keys, key)
+        if i < self.key_count and self._key(i) == key:
+            return self._company(self._key_ids[i])
+        return None
+
+    def canonicalize(self, name):
+        """Canonical company name, or the cleaned-up input if the company is unknown"""
+        entry = self.lookup(name)
+        return entry["Name"] if entry else " ".join(name.split())
+
+    def complete(self, prefix, limit=10):
+        """Companies with a name, ticker or alias starting with `prefix`, in key order"""
+        key = normalize_company(prefix, strip_suffixes=False).encode("utf-8")
+        results, seen = [], set()
+        i = bisect.bisect_left(self._keys, key)
+        while i < self.key_count and len(results) < limit:
+            if not self._key(i).startswith(key):
+                break
+            company_id = self._key_ids[i]
+            if company_id not in seen:
+                seen.add(company_id)
+                results.append(self._company(company_id))
+            i += 1
+        return results
+
+    def entries(self, limit=None):
+        """Registry entries in file order, the first `limit` if given"""
+        count = self.company_count if limit is None else min(limit, self.company_count)
+        return [self._company(i) for i in range(count)]
+
+    def names(self):
+        """All canonical names, in registry order"""
+        return [entry["Name"] for entry in self.entries()]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Shared registry, compiled and mapped on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CompanyRegistry()
+        return _registry
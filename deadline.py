@@ -0,0 +1,91 @@
+import contextvars
+import os
+import threading
+import time
+
+
+# Initial guesses of stage durations in seconds, refined from observed runs
+STAGE_COST_DEFAULTS = {
+    "articles": float(os.environ.get("STAGE_COST_ARTICLES", "2.0")),
+    # Per article
+    "sentiment": float(os.environ.get("STAGE_COST_SENTIMENT", "0.01")),
+    "translation": float(os.environ.get("STAGE_COST_TRANSLATION", "1.0")),
+    "tts": float(os.environ.get("STAGE_COST_TTS", "1.5")),
+}
+# Weight of the newest observation in the moving average
+STAGE_COST_SMOOTHING = 0.2
+# Fewer articles than this are not worth scoring properly, use the keyword scorer instead
+MIN_SCORED_ARTICLES = 3
+
+
+class Deadline:
+    """A request's latency budget, counted from when the request arrived"""
+
+    def __init__(self, budget_ms):
+        self.budget = budget_ms / 1000.0
+        self.started = time.monotonic()
+        # Stage -> how it was cut short, reported in the response's "Degraded Stages"
+        self.degraded = {}
+
+    def remaining(self):
+        """Seconds left, never negative"""
+        return max(0.0, self.budget - (time.monotonic() - self.started))
+
+    def allows(self, cost):
+        """Whether a stage expected to take `cost` seconds still fits"""
+        return self.remaining() >= cost
+
+    def cap(self, timeout):
+        """Shorten an upstream timeout so it cannot outlast the budget"""
+        return max(0.05, min(timeout, self.remaining()))
+
+    def degrade(self, stage, how):
+        self.degraded[stage] = how
+
+
+# Deadline of the request currently being processed, None when it has no budget
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class StageCosts:
+    """Exponential moving averages of how long each pipeline stage takes"""
+
+    def __init__(self, defaults=STAGE_COST_DEFAULTS, smoothing=STAGE_COST_SMOOTHING):
+        self.smoothing = smoothing
+        self._costs = dict(defaults)
+        self._lock = threading.Lock()
+
+    def estimate(self, stage, units=1):
+        with self._lock:
+            return self._costs[stage] * units
+
+    def record(self, stage, seconds, units=1):
+        """Fold one observed run of a stage (covering `units` items) into its estimate"""
+        if units <= 0:
+            return
+        with self._lock:
+            self._costs[stage] += self.smoothing * (seconds / units - self._costs[stage])
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: round(cost, 4) for stage, cost in self._costs.items()}
+
+
+stage_costs = StageCosts()
+
+
+def plan_sentiment(deadline, article_count):
+    """
+    Decide how to score articles within the remaining budget.
+
+    Returns:
+        tuple: (number of articles to score, whether to use the keyword scorer)
+    """
+    if deadline is None or deadline.allows(stage_costs.estimate("sentiment", article_count)):
+        return article_count, False
+
+    per_article = stage_costs.estimate("sentiment")
+    fits = int(deadline.remaining() / per_article) if per_article > 0 else article_count
+    if fits >= min(MIN_SCORED_ARTICLES, article_count):
+        return fits, False
+    return article_count, True
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+# Seconds between refreshes of each subscribed company
+FEED_REFRESH_SECONDS = float(os.environ.get("FEED_REFRESH_SECONDS", "60"))
+# Articles analyzed per refresh, and kept in the snapshot sent to new subscribers
+FEED_ARTICLE_COUNT = int(os.environ.get("FEED_ARTICLE_COUNT", "10"))
+# Messages buffered per subscriber before it is treated as too slow
+FEED_QUEUE_SIZE = int(os.environ.get("FEED_QUEUE_SIZE", "64"))
+# Companies one connection may subscribe to
+FEED_MAX_COMPANIES = int(os.environ.get("FEED_MAX_COMPANIES", "50"))
+# Article keys remembered per company to recognize new articles
+FEED_HISTORY = int(os.environ.get("FEED_HISTORY", "500"))
+
+
+def article_key(article):
+    return article.get("URL") or article.get("Title", "")
+
+
+class CompanyState:
+    """What subscribers of one company have been sent so far"""
+
+    def __init__(self, company):
+        self.company = company
+        self.subscribers = set()
+        self.seen = OrderedDict()
+        self.articles = []
+        self.distribution = None
+        self.refreshed = 0.0
+        self._snapshot = None
+
+    def apply(self, articles, distribution):
+        """
+        Merge a fresh analysis into the state.
+
+        Returns:
+            dict: The delta message, or None if nothing changed
+        """
+        new_articles = []
+        for article in articles:
+            key = article_key(article)
+            if key not in self.seen:
+                new_articles.append(article)
+                self.seen[key] = True
+        while len(self.seen) > FEED_HISTORY:
+            self.seen.popitem(last=False)
+
+        changed_distribution = distribution != self.distribution
+        if not new_articles and not changed_distribution:
+            return None
+
+        self.articles = (new_articles + self.articles)[:FEED_ARTICLE_COUNT]
+        self.distribution = distribution
+        self._snapshot = None
+
+        delta = {"Type": "update", "Company": self.company, "New Articles": new_articles}
+        if changed_distribution:
+            delta["Sentiment Distribution"] = distribution
+        return delta
+
+    def snapshot(self):
+        """Full state for new or resyncing subscribers, serialized once per change"""
+        if self._snapshot is None:
+            self._snapshot = json.dumps({"Type": "snapshot", "Company": self.company,
+                                         "Articles": self.articles,
+                                         "Sentiment Distribution": self.distribution})
+        return self._snapshot
+
+
+class Subscriber:
+    """
+    One WebSocket connection and its bounded queue of serialized messages.
+
+    A subscriber that lets its queue fill up loses the queued deltas and is sent
+    a fresh snapshot of each of its companies instead, so slow consumers never
+    hold up the others or grow memory without bound.
+    """
+
+    def __init__(self, queue_size=FEED_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.companies = set()
+        self.resyncs = 0
+
+    def offer(self, message, hub):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.resync(hub)
+
+    def resync(self, hub):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.resyncs += 1
+        for company in self.companies:
+            state = hub.companies.get(company)
+            if state is not None and state.distribution is not None and not self.queue.full():
+                self.queue.put_nowait(state.snapshot())
+
+
+class SentimentFeed:
+    """
+    Live per-company sentiment updates for WebSocket subscribers.
+
+    One refresher task analyzes each subscribed company every `refresh_seconds`
+    through `fetch(company)`, which returns a response body with Articles and
+    the Sentiment Distribution. Only what changed since the previous refresh is
+    published, serialized once and queued for every subscriber of the company.
+    Everything runs on the event loop, idle subscribers cost no CPU.
+    """
+
+    def __init__(self, fetch, refresh_seconds=FEED_REFRESH_SECONDS):
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        self.companies = {}
+        self.subscribers = set()
+        self.published = 0
+        self._wakeup = None
+        self._refresher = None
+
+    def connect(self):
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber):
+        self.unsubscribe(subscriber, list(subscriber.companies))
+        self.subscribers.discard(subscriber)
+
+    def subscribe(self, subscriber, companies):
+        """Add companies to a subscriber, sending the current state of each one already known"""
+        # All or nothing, a subscription over the limit leaves the watchlist as it was
+        if len(subscriber.companies | set(companies)) > FEED_MAX_COMPANIES:
+            raise ValueError(f"At most {FEED_MAX_COMPANIES} companies per connection")
+        for company in companies:
+            if company in subscriber.companies:
+                continue
+            state = self.companies.get(company)
+            if state is None:
+                state = self.companies[company] = CompanyState(company)
+            state.subscribers.add(subscriber)
+            subscriber.companies.add(company)
+            if state.distribution is not None:
+                subscriber.offer(state.snapshot(), self)
+        self._ensure_refresher()
+
+    def unsubscribe(self, subscriber, companies):
+        for company in companies:
+            subscriber.companies.discard(company)
+            state = self.companies.get(company)
+            if state is not None:
+                state.subscribers.discard(subscriber)
+                # Forget companies nobody watches any more
+                if not state.subscribers:
+                    del self.companies[company]
+
+    def publish(self, state, delta):
+        message = json.dumps(delta)
+        self.published += 1
+        for subscriber in list(state.subscribers):
+            subscriber.offer(message, self)
+
+    def _ensure_refresher(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            due = [state for state in self.companies.values()
+                   if now - state.refreshed >= self.refresh_seconds]
+            if due:
+                await asyncio.gather(*(self._refresh(state) for state in due))
+
+            # Sleep until the next company is due, or a new subscription arrives
+            if self.companies:
+                next_due = min(state.refreshed for state in self.companies.values()) + self.refresh_seconds
+                timeout = max(next_due - time.monotonic(), 0.1)
+            else:
+                timeout = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self, state):
+        state.refreshed = time.monotonic()
+        try:
+            body = await self.fetch(state.company)
+        except Exception as e:
+            print(f"Feed refresh failed for {state.company}: {str(e)}")
+            return
+
+        distribution = body.get("Comparative Sentiment Score", {}).get("Sentiment Distribution")
+        delta = state.apply(body.get("Articles", []), distribution)
+        # The company may have lost its last subscriber while the refresh ran
+        if delta is not None and state.subscribers:
+            self.publish(state, delta)
+
+    def stats(self):
+        return {"Subscribers": len(self.subscribers), "Companies": len(self.companies),
+                "Published Updates": self.published,
+                "Resyncs": sum(subscriber.resyncs for subscriber in self.subscribers)}
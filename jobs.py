@@ -0,0 +1,217 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Threads running queued analyses, independent of the HTTP worker count
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+# Seconds a finished job and its result are kept
+JOB_TTL = int(os.environ.get("JOB_TTL", "3600"))
+# Finished jobs kept at most, the oldest are dropped first since results hold the audio
+JOB_MAX_FINISHED = int(os.environ.get("JOB_MAX_FINISHED", "500"))
+# Jobs allowed to wait or run at once before new ones are rejected
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "100"))
+# Longest a GET /jobs/{id} long-poll may wait, in seconds
+JOB_MAX_WAIT = float(os.environ.get("JOB_MAX_WAIT", "30"))
+
+FINISHED_STATES = ("succeeded", "failed")
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are pending to accept another one"""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many pending jobs, try again later")
+        self.retry_after = retry_after
+
+
+class JobFailed(Exception):
+    """Raised by a job function to fail the job with an HTTP-style status code"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Job:
+    """
+    One queued analysis and its progress.
+
+    `version` increases on every change, so long-polling clients can wait for
+    the next update after the one they have seen.
+    """
+
+    def __init__(self, params, stages, id_prefix=""):
+        self.id = id_prefix + uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.stages = {stage: "pending" for stage in stages}
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.version = 0
+        self._waiters = []
+
+    def is_finished(self):
+        return self.status in FINISHED_STATES
+
+    def snapshot(self):
+        body = {
+            "Job ID": self.id,
+            "Status": self.status,
+            "Version": self.version,
+            "Request": self.params,
+            "Progress": dict(self.stages),
+            "Created": self.created,
+            "Started": self.started,
+            "Finished": self.finished,
+        }
+        if self.status == "succeeded":
+            body["Result"] = self.result
+        elif self.status == "failed":
+            body["Error"] = {"Status Code": self.status_code, "Detail": self.error}
+        return body
+
+
+class JobStore:
+    """
+    Runs jobs on a local thread pool and keeps their state for `ttl` seconds,
+    or until more than `max_finished` newer jobs have finished.
+
+    Job functions are called as `func(progress)`, where `progress(stage, state)`
+    records the state of one pipeline stage. Whatever the function returns
+    becomes the job result.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_TTL, max_pending=JOB_MAX_PENDING,
+                 max_finished=JOB_MAX_FINISHED, id_prefix=""):
+        self.ttl = ttl
+        # Prepended to job ids, names the node holding the job in a cluster
+        self.id_prefix = id_prefix
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._jobs = {}
+        # Finish times of finished jobs, oldest first
+        self._finished = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def submit(self, func, params, stages):
+        """Queue a job, returning it right away"""
+        job = Job(params, stages, self.id_prefix)
+        with self._lock:
+            self._purge()
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(retry_after=5)
+            self._pending += 1
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    async def wait(self, job_id, timeout=0, since=None):
+        """
+        Long-poll a job.
+
+        Returns once the job is finished, or, if `since` is given, as soon as its
+        version is newer than `since`. Returns the job, or None if it is unknown.
+        """
+        job = self.get(job_id)
+        if job is None or timeout <= 0:
+            return job
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self._ready(job, since):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            future = loop.create_future()
+            with self._lock:
+                if self._ready(job, since):
+                    break
+                job._waiters.append((loop, future))
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                break
+        return job
+
+    @staticmethod
+    def _ready(job, since):
+        return job.is_finished() or (since is not None and job.version > since)
+
+    def _update(self, job, **changes):
+        """Apply changes to a job and wake its long-polling clients"""
+        with self._lock:
+            stages = changes.pop("stages", None)
+            if stages:
+                job.stages.update(stages)
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            waiters, job._waiters = job._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _run(self, job, func):
+        self._update(job, status="running", started=time.time())
+
+        def progress(stage, state):
+            self._update(job, stages={stage: state})
+
+        try:
+            result = func(progress)
+        except JobFailed as e:
+            self._finish(job, status="failed", status_code=e.status_code, error=e.detail)
+        except Exception as e:
+            self._finish(job, status="failed", status_code=500, error=str(e))
+        else:
+            self._finish(job, status="succeeded", result=result)
+
+    def _finish(self, job, **changes):
+        # Stages that never ran were answered from the response cache, or cut short by a failure
+        unrun = "cached" if changes["status"] == "succeeded" else "skipped"
+        stages = {stage: unrun for stage, state in job.stages.items() if state == "pending"}
+        finished = time.time()
+        with self._lock:
+            self._pending -= 1
+            self._finished[job.id] = finished
+            self._purge()
+        self._update(job, stages=stages, finished=finished, **changes)
+
+    def _purge(self):
+        """Drop finished jobs older than the TTL or beyond the limit, the caller holds the lock"""
+        cutoff = time.time() - self.ttl
+        while self._finished:
+            job_id, finished = next(iter(self._finished.items()))
+            if finished >= cutoff and len(self._finished) <= self.max_finished:
+                break
+            self._finished.popitem(last=False)
+            self._jobs.pop(job_id, None)
+
+    def snapshot(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"Pending": self._pending, "Max Pending": self.max_pending,
+                    "Max Finished": self.max_finished, "Jobs": counts}
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
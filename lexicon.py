@@ -0,0 +1,371 @@
+"""
+Compact, memory-mapped copy of TextBlob's sentiment lexicon.
+
+TextBlob imports NLTK and parses en-sentiment.xml into nested Python dicts in
+every process that scores text. Here the lexicon, together with the tokenizer
+tables and emoticons it relies on, is compiled once into a binary file that all
+workers map read-only, so its pages are shared and TextBlob is only needed to
+build it. Texts are tokenized and scored with the same rules as TextBlob's
+PatternAnalyzer, so the polarity is identical.
+
+Build the file ahead of time (otherwise the first process to score text does):
+    python -m lexicon build
+"""
+import argparse
+import bisect
+import importlib.metadata
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+
+
+try:
+    TEXTBLOB_VERSION = importlib.metadata.version("textblob")
+except importlib.metadata.PackageNotFoundError:
+    TEXTBLOB_VERSION = "unknown"
+
+# Compiled lexicon file, built on first use if it does not exist. The default
+# name carries the TextBlob version so an upgrade compiles a fresh copy
+SENTIMENT_LEXICON_PATH = os.environ.get(
+    "SENTIMENT_LEXICON_PATH",
+    os.path.join(tempfile.gettempdir(), f"sentiment-lexicon-{TEXTBLOB_VERSION}.bin"))
+
+# Keywords for when the lexicon cannot be used, kept as code so they never depend on it.
+# Duplicates count twice, as they always have
+FALLBACK_POSITIVE_WORDS = ["success", "profit", "growth", "increase", "improved", "rise",
+                           "strong", "exceed", "exceed", "optimistic", "positive", "advantage"]
+FALLBACK_NEGATIVE_WORDS = ["decline", "loss", "down", "fell", "fall", "drop", "struggle",
+                           "concern", "risk", "warning", "negative", "problem", "issue", "fail"]
+
+# PatternAnalyzer settings for English
+NEGATIONS = ("no", "not", "n't", "never")
+
+LEXICON_MAGIC = b"SLEX0001"
+# magic, word count
+LEXICON_HEADER = struct.Struct("<8sI")
+# Word flag: the word has an adverb sense and can modify the next word
+FLAG_MODIFIER = 1
+
+
+def build_lexicon(path=SENTIMENT_LEXICON_PATH):
+    """
+    Compile TextBlob's English sentiment lexicon into the binary format.
+
+    Each word keeps the scores TextBlob uses for untagged text (the average over
+    its part-of-speech senses), stored as float64 so scores match exactly.
+    Layout after the header: u32 word offsets, float64 polarity, subjectivity and
+    intensity arrays, u8 flags, the sorted UTF-8 words, then a JSON trailer with
+    the tokenizer tables and emoticons.
+    """
+    from textblob._text import ABBREVIATIONS, EMOTICONS, PUNCTUATION, replacements
+    from textblob.en import sentiment
+
+    sentiment.load()
+    words = sorted(dict.keys(sentiment), key=lambda word: word.encode("utf-8"))
+    encoded = [word.encode("utf-8") for word in words]
+
+    offsets, position = [], 0
+    for word in encoded:
+        offsets.append(position)
+        position += len(word)
+    offsets.append(position)
+
+    scores = [dict.__getitem__(sentiment, word)[None] for word in words]
+    flags = [FLAG_MODIFIER if any(modifier in dict.__getitem__(sentiment, word)
+                                  for modifier in sentiment.modifiers) else 0
+             for word in words]
+    trailer = json.dumps({
+        "punctuation": PUNCTUATION,
+        "abbreviations": sorted(ABBREVIATIONS),
+        "replacements": list(replacements.items()),
+        # Kept in TextBlob's iteration order, which decides overlapping matches
+        "emoticons": [[emoticon, polarity] for (_, polarity), emoticons in EMOTICONS.items()
+                      for emoticon in emoticons],
+    }).encode("utf-8")
+
+    # Write under a temporary name so concurrent workers never map a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        f.write(LEXICON_HEADER.pack(LEXICON_MAGIC, len(words)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        for column in range(3):
+            f.write(struct.pack(f"<{len(words)}d", *(score[column] for score in scores)))
+        f.write(bytes(flags))
+        f.write(b"".join(encoded))
+        f.write(trailer)
+    # mkstemp creates the file private, every worker needs to read it
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+
+
+class Tokenizer:
+    """
+    TextBlob's English sentence tokenizer (textblob._text.find_tokens), ported
+    so scoring does not need to import TextBlob and NLTK. The tables come from
+    the compiled lexicon.
+    """
+
+    END_OF_SENTENCE = "END-OF-SENTENCE"
+    TOKEN = re.compile(r"(\S+)\s")
+    # Single letter ("T. De Smedt"), alternating letters ("U.S."), capital and consonants ("Mr.")
+    ABBREVIATION_PATTERNS = [re.compile(r"^[A-Za-z]\.$"), re.compile(r"^([A-Za-z]\.)+$"),
+                             re.compile("^[A-Z][" + "|".join("bcdfghjklmnpqrstvwxz") + "]+.$")]
+    SARCASM = re.compile(r"\( ?\! ?\)")
+
+    def __init__(self, punctuation, abbreviations, replacements, emoticons):
+        self.punctuation = punctuation
+        self.abbreviations = set(abbreviations)
+        self.replacements = replacements
+        self._replace_keys = {key for key, _ in replacements}
+        self._leading = tuple(punctuation.replace(".", ""))
+        self._trailing = self._leading + (".",)
+        self._emoticons = re.compile(r"(%s)($|\s)" % "|".join(
+            r" ?".join(re.escape(char) for char in emoticon) for emoticon, _ in emoticons))
+
+    def _is_abbreviation(self, token):
+        return token in self.abbreviations or any(
+            pattern.match(token) is not None for pattern in self.ABBREVIATION_PATTERNS)
+
+    def sentences(self, string):
+        """Split a text into sentences of space-separated tokens"""
+        for old, new in self.replacements:
+            string = re.sub(old, new, string)
+        for quote in ("\u201c", "\u201d", "\u2018", "\u2019", "'", '"'):
+            string = string.replace(quote, f" {quote} ")
+        string = re.sub("\r\n", "\n", string)
+        string = re.sub(r"\n{2,}", f" {self.END_OF_SENTENCE} ", string)
+        string = re.sub(r"\s+", " ", string)
+
+        tokens = []
+        for token in self.TOKEN.findall(string + " "):
+            tail = []
+            # Split leading punctuation
+            while token.startswith(self._leading) and token not in self._replace_keys:
+                tokens.append(token[0])
+                token = token[1:]
+            while token.endswith(self._trailing) and token not in self._replace_keys:
+                # Split trailing punctuation
+                if token.endswith(self._leading):
+                    tail.append(token[-1])
+                    token = token[:-1]
+                # Split an ellipsis before a period
+                if token.endswith("..."):
+                    tail.append("...")
+                    token = token[:-3].rstrip(".")
+                # Split a period unless it ends an abbreviation
+                if token.endswith("."):
+                    if self._is_abbreviation(token):
+                        break
+                    tail.append(token[-1])
+                    token = token[:-1]
+            if token != "":
+                tokens.append(token)
+            tokens.extend(reversed(tail))
+
+        sentences, i, j = [[]], 0, 0
+        while j < len(tokens):
+            if tokens[j] in ("...", ".", "!", "?", self.END_OF_SENTENCE):
+                # Keep closing quotes, parentheses and repeated punctuation with the sentence
+                while j < len(tokens) and tokens[j] in ("'", "\"", "\u201d", "\u2019", "...", ".", "!",
+                                                        "?", ")", self.END_OF_SENTENCE):
+                    if tokens[j] in ("'", "\"") and sentences[-1].count(tokens[j]) % 2 == 0:
+                        break
+                    j += 1
+                sentences[-1].extend(t for t in tokens[i:j] if t != self.END_OF_SENTENCE)
+                sentences.append([])
+                i = j
+            j += 1
+        sentences[-1].extend(tokens[i:j])
+
+        result = []
+        for sentence in sentences:
+            if sentence:
+                sentence = self.SARCASM.sub("(!)", " ".join(sentence))
+                result.append(self._emoticons.sub(
+                    lambda m: m.group(1).replace(" ", "") + m.group(2), sentence))
+        return result
+
+
+class _WordView:
+    """Sequence of the lexicon words, read straight from the mapped file for bisect"""
+
+    def __init__(self, lexicon):
+        self.lexicon = lexicon
+
+    def __len__(self):
+        return self.lexicon.word_count
+
+    def __getitem__(self, i):
+        return self.lexicon._word(i)
+
+
+class SentimentLexicon:
+    """
+    Read-only view of a compiled lexicon file, scored like TextBlob's PatternAnalyzer.
+
+    The score arrays are memoryviews into the mapping, so lookups read the
+    shared pages directly instead of building per-process dicts.
+    """
+
+    def __init__(self, path=SENTIMENT_LEXICON_PATH):
+        if not os.path.exists(path):
+            build_lexicon(path)
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, self.word_count = LEXICON_HEADER.unpack_from(self._mmap, 0)
+        if magic != LEXICON_MAGIC:
+            raise ValueError(f"{path} is not a compiled sentiment lexicon")
+
+        n = self.word_count
+        position = LEXICON_HEADER.size
+        self._offsets = view[position:position + 4 * (n + 1)].cast("I")
+        position += 4 * (n + 1)
+        self._polarity = view[position:position + 8 * n].cast("d")
+        self._subjectivity = view[position + 8 * n:position + 16 * n].cast("d")
+        self._intensity = view[position + 16 * n:position + 24 * n].cast("d")
+        position += 24 * n
+        self._flags = view[position:position + n]
+        self._words_start = position + n
+        self._words = _WordView(self)
+
+        trailer = json.loads(self._mmap[self._words_start + self._offsets[n]:].decode("utf-8"))
+        self._tokenizer = Tokenizer(trailer["punctuation"], trailer["abbreviations"],
+                                    trailer["replacements"], trailer["emoticons"])
+        # First matching emoticon group wins, as in TextBlob
+        self._emoticons = {}
+        for emoticon, polarity in trailer["emoticons"]:
+            self._emoticons.setdefault(emoticon.lower(), polarity)
+
+    def _word(self, i):
+        return self._mmap[self._words_start + self._offsets[i]:self._words_start + self._offsets[i + 1]]
+
+    def lookup(self, word):
+        """Index of a word in the lexicon, or -1 if it is unknown"""
+        key = word.encode("utf-8")
+        i = bisect.bisect_left(self._words, key)
+        if i < self.word_count and self._word(i) == key:
+            return i
+        return -1
+
+    def scores(self, word):
+        """(polarity, subjectivity, intensity) of a word, or None if it is unknown"""
+        i = self.lookup(word)
+        if i < 0:
+            return None
+        return self._polarity[i], self._subjectivity[i], self._intensity[i]
+
+    def polarity(self, text):
+        """
+        Polarity of a text between -1.0 and 1.0, as TextBlob(text).sentiment.polarity.
+
+        Known words are averaged, an adverb before a word scales it by its
+        intensity ("very good"), a preceding negation flips and halves it
+        ("not good"), and "!" boosts the previous word.
+        """
+        if not isinstance(text, str):
+            raise TypeError(f"The text argument must be a string, not {type(text).__name__}")
+
+        # Assessments as [polarity, subjectivity, intensity, negated]
+        assessments = []
+        modifier = None
+        negation = None
+        for word in " ".join(self._tokenizer.sentences(text)).split():
+            word = word.lower()
+            i = self.lookup(word)
+            if i >= 0:
+                polarity, subjectivity, intensity = self._polarity[i], self._subjectivity[i], self._intensity[i]
+                if modifier is None:
+                    # Known word not preceded by a modifier ("good")
+                    assessments.append([polarity, subjectivity, intensity, False])
+                else:
+                    # Known word preceded by a modifier ("really good")
+                    last = assessments[-1]
+                    last[0] = max(-1.0, min(polarity * last[2], +1.0))
+                    last[1] = max(-1.0, min(subjectivity * last[2], +1.0))
+                    last[2] = intensity
+                if negation is not None:
+                    # Known word preceded by a negation ("not really good")
+                    assessments[-1][2] = 1.0 / assessments[-1][2]
+                    assessments[-1][3] = True
+                modifier = word if self._flags[i] & FLAG_MODIFIER else None
+                negation = word if word in NEGATIONS else None
+            else:
+                if word in NEGATIONS:
+                    negation = word
+                elif negation and len(word.strip("'")) > 1:
+                    # Negations carry across small words only ("not a good")
+                    negation = None
+                if negation is not None and modifier is not None and modifier.endswith("ly"):
+                    # A negation after a modifier ("really not good")
+                    assessments[-1][3] = True
+                    negation = None
+                elif modifier and len(word) > 2:
+                    # Modifiers carry across small words only ("really is a good")
+                    modifier = None
+                if word == "!" and assessments:
+                    assessments[-1][0] = max(-1.0, min(assessments[-1][0] * 1.25, +1.0))
+                if word == "(!)":
+                    assessments.append([0.0, 1.0, 1.0, False])
+                if word.isalpha() is False and len(word) <= 5 and word not in self._tokenizer.punctuation:
+                    emoticon = self._emoticons.get(word)
+                    if emoticon is not None:
+                        assessments.append([emoticon, 1.0, 1.0, False])
+
+        # "not good" is slightly bad, "not bad" slightly good
+        total = sum(polarity * -0.5 if negated else polarity
+                    for polarity, _, _, negated in assessments)
+        return total / float(len(assessments) or 1)
+
+
+def keyword_sentiment(text):
+    """Label a text by counting the fallback keywords it contains"""
+    text_lower = text.lower()
+
+    # Count occurrences of positive and negative words
+    positive_count = sum(1 for word in FALLBACK_POSITIVE_WORDS if word in text_lower)
+    negative_count = sum(1 for word in FALLBACK_NEGATIVE_WORDS if word in text_lower)
+
+    # Determine sentiment based on counts
+    if positive_count > negative_count:
+        return "Positive"
+    elif negative_count > positive_count:
+        return "Negative"
+    else:
+        return "Neutral"
+
+
+_lexicon = None
+_lexicon_lock = threading.Lock()
+
+
+def get_lexicon():
+    """Shared lexicon, compiled and mapped on first use"""
+    global _lexicon
+    with _lexicon_lock:
+        if _lexicon is None:
+            _lexicon = SentimentLexicon()
+        return _lexicon
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m lexicon",
+                                     description="Compile the sentiment lexicon for memory-mapping")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--output", default=SENTIMENT_LEXICON_PATH, help="Compiled lexicon file")
+    args = parser.parse_args(argv)
+
+    build_lexicon(args.output)
+    print(f"Wrote {os.path.getsize(args.output)} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# Request priorities, lower values are served first
+PRIORITIES = {"interactive": 0, "background": 1}
+
+# Priority of the request currently being processed, read by the upstream calls in utils
+request_priority = contextvars.ContextVar("request_priority", default="interactive")
+
+# Admission control settings
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "8"))
+MAX_QUEUED = int(os.environ.get("MAX_QUEUED", "32"))
+
+# Per-client token bucket settings
+CLIENT_RATE_PER_MINUTE = float(os.environ.get("CLIENT_RATE_PER_MINUTE", "30"))
+CLIENT_BURST = int(os.environ.get("CLIENT_BURST", "10"))
+
+# Call budgets per upstream over QUOTA_WINDOW seconds
+QUOTA_WINDOW = int(os.environ.get("QUOTA_WINDOW", str(24 * 60 * 60)))
+UPSTREAM_QUOTAS = {
+    "newsapi": int(os.environ.get("NEWSAPI_QUOTA", "100")),
+    "google": int(os.environ.get("GOOGLE_QUOTA", "300")),
+    "mymemory": int(os.environ.get("MYMEMORY_QUOTA", "500")),
+    "gtts": int(os.environ.get("GTTS_QUOTA", "1000")),
+}
+# Below this fraction of the budget only interactive requests may use an upstream
+QUOTA_LOW_WATER = float(os.environ.get("QUOTA_LOW_WATER", "0.2"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted, carries the suggested retry delay"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, int(round(retry_after)))
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """
+        Take one token from the bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class ClientRateLimiter:
+    """Token bucket per client, keeping at most `max_clients` buckets around"""
+
+    def __init__(self, rate_per_minute=CLIENT_RATE_PER_MINUTE, burst=CLIENT_BURST, max_clients=10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client_id):
+        """Take a token for the client or raise AdmissionRejected"""
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[client_id] = bucket
+            self._buckets.move_to_end(client_id)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+            wait = bucket.take()
+
+        if wait > 0:
+            raise AdmissionRejected(f"Rate limit exceeded for client {client_id}", wait)
+
+
+class AdmissionQueue:
+    """
+    Bounded in-flight limit with a priority-ordered waiting queue.
+
+    Up to `max_in_flight` requests run at once and up to `max_queued` more wait
+    for a slot, interactive requests ahead of background ones. Anything beyond
+    that is rejected straight away with an estimated retry delay.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.in_flight = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        # Moving average of request service time, used for Retry-After
+        self.avg_service_time = 1.0
+
+    def retry_after(self):
+        """Estimate how long until a newly queued request would get a slot"""
+        backlog = len(self._waiters) + 1
+        return self.avg_service_time * backlog / max(1, self.max_in_flight)
+
+    async def acquire(self, priority="interactive"):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queued:
+            raise AdmissionRejected("Server is at capacity", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (PRIORITIES.get(priority, 0), next(self._counter), waiter)
+        heapq.heappush(self._waiters, entry)
+        try:
+            # The slot is handed over by release() without touching in_flight
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self, service_time=None):
+        if service_time is not None:
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self):
+        return {"In Flight": self.in_flight, "Queued": len(self._waiters),
+                "Max In Flight": self.max_in_flight, "Max Queued": self.max_queued}
+
+
+class QuotaLedger:
+    """
+    Shared call budget per upstream service.
+
+    Every upstream call reserves one unit before it is made. Once an upstream is
+    down to its low-water mark the remaining budget is kept for interactive
+    requests, so background work falls back to cached or local paths first.
+    """
+
+    def __init__(self, quotas=UPSTREAM_QUOTAS, window=QUOTA_WINDOW, low_water=QUOTA_LOW_WATER):
+        self.quotas = dict(quotas)
+        self.window = window
+        self.low_water = low_water
+        self._used = {name: 0 for name in self.quotas}
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _roll_window(self):
+        if time.monotonic() - self._window_start >= self.window:
+            self._used = {name: 0 for name in self.quotas}
+            self._window_start = time.monotonic()
+
+    def remaining(self, upstream):
+        with self._lock:
+            self._roll_window()
+            return self.quotas[upstream] - self._used[upstream]
+
+    def is_low(self, upstream):
+        """Check whether an upstream is down to the budget kept for interactive requests"""
+        return self.remaining(upstream) <= self.quotas[upstream] * self.low_water
+
+    def _allowed(self, upstream, priority):
+        remaining = self.quotas[upstream] - self._used[upstream]
+        if remaining <= 0:
+            return False
+        if priority != "interactive" and remaining <= self.quotas[upstream] * self.low_water:
+            return False
+        return True
+
+    def available(self, upstream, priority=None):
+        """Check whether a call could be reserved right now, without reserving it"""
+        priority = priority or request_priority.get()
+        with self._lock:
+            self._roll_window()
+            return self._allowed(upstream, priority)
+
+    def reserve(self, upstream, priority=None):
+        """
+        Reserve budget for one call to an upstream.
+
+        Args:
+            upstream (str): Name of the upstream service
+            priority (str): Request priority, defaults to the current request's
+
+        Returns:
+            bool: True if the call may be made
+        """
+        priority = priority or request_priority.get()
+        with self._lock:
+            self._roll_window()
+            if not self._allowed(upstream, priority):
+                return False
+            self._used[upstream] += 1
+            return True
+
+    def snapshot(self):
+        with self._lock:
+            self._roll_window()
+            return {name: {"Used": self._used[name], "Quota": quota}
+                    for name, quota in self.quotas.items()}
+
+
+# Shared ledger used by the upstream calls in utils
+quota_ledger = QuotaLedger()
@@ -0,0 +1,144 @@
+import os
+import threading
+import tracemalloc
+
+
+# Trace allocations per pipeline stage, tracemalloc makes every allocation slower
+MEMORY_TRACKING = os.environ.get("MEMORY_TRACKING", "").lower() in ("1", "true", "yes")
+# Frames stored per traced allocation, more frames cost more memory
+MEMORY_TRACE_FRAMES = int(os.environ.get("MEMORY_TRACE_FRAMES", "1"))
+
+
+def rss_kb():
+    """Resident set size of this process in KB, None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_kb():
+    """Highest resident set size this process reached, in KB"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux reports KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class StageMemory:
+    """Allocation figures of one pipeline stage across requests"""
+
+    def __init__(self):
+        self.calls = 0
+        self.growth = 0
+        self.max_growth = 0
+        self.max_peak = 0
+
+    def record(self, growth, peak):
+        self.calls += 1
+        self.growth += growth
+        self.max_growth = max(self.max_growth, growth)
+        self.max_peak = max(self.max_peak, peak)
+
+    def snapshot(self):
+        return {"Calls": self.calls,
+                "Mean Growth KB": round(self.growth / self.calls / 1024, 1) if self.calls else 0,
+                "Max Growth KB": round(self.max_growth / 1024, 1),
+                "Max Peak KB": round(self.max_peak / 1024, 1)}
+
+
+class RequestMemory:
+    """
+    Follows one request through the pipeline's progress reports.
+
+    Wraps the request's `progress(stage, state)` callback. Everything allocated
+    between a stage's previous report and its "done" or "skipped" report is
+    charged to that stage: the growth is what is still held afterwards, the peak
+    the most that was held at once. What is left after the last stage is charged
+    to "serialization" by `finish`.
+    """
+
+    def __init__(self, tracker, progress=None):
+        self.tracker = tracker
+        self.progress = progress
+        self.started = self.mark = tracker.reset()
+        self.peak = 0
+
+    def __call__(self, stage, state):
+        if state != "running":
+            self._charge(stage)
+        else:
+            self.mark = self.tracker.reset()
+        if self.progress:
+            self.progress(stage, state)
+
+    def _charge(self, stage):
+        current, peak = self.tracker.read()
+        self.tracker.record(stage, current - self.mark, peak - self.mark)
+        self.peak = max(self.peak, peak - self.started)
+        self.mark = self.tracker.reset()
+
+    def finish(self):
+        """Charge the remaining allocations to serialization and close the request"""
+        self._charge("serialization")
+        self.tracker.record("request", self.mark - self.started, self.peak)
+
+
+class MemoryTracker:
+    """
+    Per-stage allocation accounting with tracemalloc.
+
+    tracemalloc counts the whole process, so figures are exact while one request
+    runs at a time and blend concurrent requests together otherwise. Disabled
+    unless MEMORY_TRACKING is set, in which case `track` returns None and the
+    pipeline runs untouched.
+    """
+
+    def __init__(self, enabled=MEMORY_TRACKING, frames=MEMORY_TRACE_FRAMES):
+        self.enabled = enabled
+        self.frames = frames
+        self.max_traced = 0
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def track(self, progress=None):
+        """Start accounting for one request, wrapping its progress callback"""
+        if not self.enabled:
+            return None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        return RequestMemory(self, progress)
+
+    def read(self):
+        return tracemalloc.get_traced_memory()
+
+    def reset(self):
+        """Start a new peak window, returning the memory traced right now"""
+        with self._lock:
+            current, peak = tracemalloc.get_traced_memory()
+            # Keep the process-wide peak that resetting would forget
+            self.max_traced = max(self.max_traced, peak)
+            tracemalloc.reset_peak()
+        return current
+
+    def record(self, stage, growth, peak):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = StageMemory()
+            self._stages[stage].record(growth, max(peak, 0))
+
+    def snapshot(self):
+        snapshot = {"Tracking": self.enabled, "RSS KB": rss_kb(), "Peak RSS KB": peak_rss_kb()}
+        if self.enabled and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            with self._lock:
+                snapshot["Traced KB"] = round(current / 1024, 1)
+                snapshot["Traced Peak KB"] = round(max(self.max_traced, peak) / 1024, 1)
+                snapshot["Stages"] = {stage: memory.snapshot() for stage, memory in self._stages.items()}
+        return snapshot
+
+
+memory_tracker = MemoryTracker()
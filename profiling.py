@@ -0,0 +1,148 @@
+import contextvars
+import cProfile
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+
+# Where profiles of individual requests are stored
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "news_profiles"))
+# Seconds between stack samples
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.001"))
+# Rows in the hot-function table
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "25"))
+
+# Set while a call runs under the profiler, so work that is normally handed to
+# other threads stays on the profiled one
+profiling_active = contextvars.ContextVar("profiling_active", default=False)
+
+# Pipeline stage a function belongs to, by the path of its source file
+STAGE_PATTERNS = [
+    ("html_parsing", re.compile(r"[/\\](bs4|html5lib|lxml)[/\\]|[/\\]html[/\\]parser\.py")),
+    ("sentiment", re.compile(r"[/\\](textblob|nltk|onnxruntime|tokenizers)[/\\]|(sentiment|lexicon)\.py$")),
+    ("regex", re.compile(r"[/\\]re[/\\]|[/\\]re\.py$|sre_")),
+    ("serialization", re.compile(r"[/\\]json[/\\]|base64\.py$|cache\.py$")),
+    ("network", re.compile(r"[/\\](requests|urllib3|http|ssl|socket)[/\\.]")),
+    ("tts", re.compile(r"[/\\]gtts[/\\]|tts_segments\.py$")),
+]
+
+
+def classify_stage(filename):
+    """Map a source file to the pipeline stage it belongs to"""
+    for stage, pattern in STAGE_PATTERNS:
+        if pattern.search(filename):
+            return stage
+    return "other"
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval.
+
+    The samples are kept as collapsed stacks ("outer;inner;leaf count"), the
+    input format of flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profile-sampler")
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def hot_functions(profiler, top_n=PROFILE_TOP_N):
+    """
+    Summarize a cProfile run.
+
+    Returns:
+        tuple: (top-N functions by own time, cumulative own time per stage in ms)
+    """
+    stats = pstats.Stats(profiler)
+    rows = []
+    stages = Counter()
+    for (filename, line, name), (calls, _, own, cumulative, _) in stats.stats.items():
+        stage = classify_stage(filename)
+        stages[stage] += own * 1000
+        rows.append({
+            "Function": f"{os.path.basename(filename)}:{line}({name})",
+            "Stage": stage,
+            "Calls": calls,
+            "Own ms": round(own * 1000, 3),
+            "Cumulative ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["Own ms"], reverse=True)
+    return rows[:top_n], {stage: round(ms, 3) for stage, ms in stages.most_common()}
+
+
+def profile_call(label, func, *args, **kwargs):
+    """
+    Run one call under the deterministic profiler and the stack sampler.
+
+    Both only watch the calling thread, so the request has to run its stages
+    there, which `profiling_active` tells it to. The raw profile (.prof, for snakeviz or pstats) and the collapsed
+    stacks (.collapsed, for flamegraphs) are written to PROFILE_DIR.
+
+    Returns:
+        tuple: (result of the call, profile report dict)
+    """
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+
+    token = profiling_active.set(True)
+    started = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        sampler.stop()
+        profiling_active.reset(token)
+    elapsed = time.perf_counter() - started
+
+    top, stages = hot_functions(profiler)
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_label = re.sub(r"\W+", "_", label)
+    base = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}")
+    profiler.dump_stats(base + ".prof")
+    collapsed = sampler.collapsed()
+    with open(base + ".collapsed", "w") as f:
+        f.write(collapsed)
+
+    report = {
+        "Wall ms": round(elapsed * 1000, 3),
+        "Stage ms": stages,
+        "Top Functions": top,
+        "Collapsed Stacks": collapsed,
+        "Files": {"pstats": base + ".prof", "collapsed": base + ".collapsed"},
+    }
+    return result, report
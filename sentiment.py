@@ -0,0 +1,237 @@
+import os
+import queue
+from abc import ABC, abstractmethod
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from utils import analyze_sentiment
+
+
+# Which backend scores article sentiment: "textblob" or "onnx"
+SENTIMENT_BACKEND = os.environ.get("SENTIMENT_BACKEND", "textblob")
+# ONNX model settings, the tokenizer is a Hugging Face tokenizer.json
+SENTIMENT_MODEL_PATH = os.environ.get("SENTIMENT_MODEL_PATH", "")
+SENTIMENT_TOKENIZER_PATH = os.environ.get("SENTIMENT_TOKENIZER_PATH", "")
+SENTIMENT_LABELS = os.environ.get("SENTIMENT_LABELS", "Negative,Positive").split(",")
+SENTIMENT_MAX_LENGTH = int(os.environ.get("SENTIMENT_MAX_LENGTH", "128"))
+# Two-class models call a text Neutral when neither class reaches this probability
+SENTIMENT_NEUTRAL_THRESHOLD = float(os.environ.get("SENTIMENT_NEUTRAL_THRESHOLD", "0.6"))
+
+# Micro-batching settings
+SENTIMENT_BATCH_SIZE = int(os.environ.get("SENTIMENT_BATCH_SIZE", "32"))
+SENTIMENT_BATCH_WAIT_MS = float(os.environ.get("SENTIMENT_BATCH_WAIT_MS", "5"))
+SENTIMENT_WORKERS = int(os.environ.get("SENTIMENT_WORKERS", "1"))
+
+
+class SentimentBackend(ABC):
+    """Interface for sentiment models, which label a whole batch of texts at once"""
+
+    name = "base"
+    # Whether the model gains from larger batches, otherwise texts are scored inline
+    batched = True
+
+    @abstractmethod
+    def predict_batch(self, texts):
+        """
+        Label a batch of texts.
+
+        Args:
+            texts (list): Texts to score
+
+        Returns:
+            list: "Positive", "Negative" or "Neutral" for each text, in order
+        """
+
+
+class TextBlobBackend(SentimentBackend):
+    """The original TextBlob scorer with its keyword fallback, one text at a time"""
+
+    name = "textblob"
+    # Pure Python and bound by the GIL, batching would only add queueing delay
+    batched = False
+
+    def predict_batch(self, texts):
+        return [analyze_sentiment(text) for text in texts]
+
+
+class OnnxBackend(SentimentBackend):
+    """
+    Transformer classifier exported to ONNX (and optionally quantized) on CPU.
+
+    Each batch is tokenized, padded to its longest text and run as a single
+    inference call. Needs the optional `onnxruntime` and `tokenizers` packages.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=SENTIMENT_MODEL_PATH, tokenizer_path=SENTIMENT_TOKENIZER_PATH,
+                 labels=SENTIMENT_LABELS, max_length=SENTIMENT_MAX_LENGTH,
+                 neutral_threshold=SENTIMENT_NEUTRAL_THRESHOLD):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        options = onnxruntime.SessionOptions()
+        # Batches already run in parallel on the inference pool, keep each one on one thread
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+
+        self.labels = [label.strip().capitalize() for label in labels]
+        self.neutral_threshold = neutral_threshold
+
+    def predict_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feed = {name: value for name, value in feed.items() if name in self.input_names}
+
+        logits = self.session.run(None, feed)[0]
+        # Softmax per row
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs = exp / exp.sum(axis=1, keepdims=True)
+
+        results = []
+        for row in probs:
+            best = int(row.argmax())
+            if len(self.labels) == 2 and row[best] < self.neutral_threshold:
+                results.append("Neutral")
+            else:
+                results.append(self.labels[best])
+        return results
+
+
+def resolve_futures(backend, futures, labels):
+    """Hand each future its label, failing them all if the backend returned the wrong number"""
+    if len(labels) != len(futures):
+        # The labels cannot be matched to texts, and an unresolved future would hang its caller
+        error = RuntimeError(f"{backend.name} backend returned {len(labels)} labels for {len(futures)} texts")
+        for future in futures:
+            future.set_exception(error)
+        return
+    for future, label in zip(futures, labels):
+        future.set_result(label)
+
+
+class MicroBatcher:
+    """
+    Collects texts from concurrent requests into batches for a sentiment backend.
+
+    A collector thread waits for the first text, then keeps gathering for up to
+    `max_wait_ms` or until `max_batch_size` texts are queued, and hands the batch
+    to an inference thread pool. Callers get one Future per text.
+    """
+
+    def __init__(self, backend, max_batch_size=SENTIMENT_BATCH_SIZE,
+                 max_wait_ms=SENTIMENT_BATCH_WAIT_MS, workers=SENTIMENT_WORKERS):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sentiment")
+        self._collector = None
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        """Queue one text, returning a Future for its label"""
+        return self.submit_many([text])[0]
+
+    def submit_many(self, texts):
+        """Queue several texts, returning one Future per text"""
+        if not self.backend.batched:
+            return self._run_inline(texts)
+
+        self._ensure_collector()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return futures
+
+    def predict(self, texts):
+        """Label texts through the batcher, blocking until all are done"""
+        return [future.result() for future in self.submit_many(texts)]
+
+    def _run_inline(self, texts):
+        futures = [Future() for _ in texts]
+        try:
+            labels = self.backend.predict_batch(texts)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return futures
+        resolve_futures(self.backend, futures, labels)
+        return futures
+
+    def _ensure_collector(self):
+        with self._lock:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, daemon=True,
+                                                   name="sentiment-batcher")
+                self._collector.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            labels = self.backend.predict_batch(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.texts += len(batch)
+        resolve_futures(self.backend, [future for _, future in batch], labels)
+
+    def stats(self):
+        return {"Backend": self.backend.name, "Batches": self.batches,
+                "Average Batch Size": round(self.texts / self.batches, 2) if self.batches else 0}
+
+
+def create_backend(name=SENTIMENT_BACKEND):
+    """Build the configured backend, falling back to TextBlob if it cannot be loaded"""
+    if name == "onnx":
+        try:
+            return OnnxBackend()
+        except Exception as e:
+            print(f"Could not load ONNX sentiment model, using TextBlob: {str(e)}")
+    return TextBlobBackend()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Shared micro-batching scheduler for the configured backend, created on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = MicroBatcher(create_backend())
+        return _scheduler
@@ -0,0 +1,163 @@
+import bisect
+import hashlib
+import hmac
+import os
+import threading
+import requests
+
+
+# Base URLs of every API node, e.g. "http://10.0.0.1:8000,http://10.0.0.2:8000"
+CLUSTER_NODES = [node.strip().rstrip("/") for node in os.environ.get("CLUSTER_NODES", "").split(",")
+                 if node.strip()]
+# This node's own entry in CLUSTER_NODES
+NODE_URL = os.environ.get("NODE_URL", "").rstrip("/")
+# Points per node on the ring, more points spread companies more evenly
+CLUSTER_VNODES = int(os.environ.get("CLUSTER_VNODES", "128"))
+# Seconds to wait for the owner node before serving the request locally
+CLUSTER_FORWARD_TIMEOUT = float(os.environ.get("CLUSTER_FORWARD_TIMEOUT", "60"))
+# Shared by every node, proves a forwarded request really came from one of them
+CLUSTER_SECRET = os.environ.get("CLUSTER_SECRET")
+
+# Set on forwarded requests so the owner never forwards them again
+FORWARDED_HEADER = "X-Forwarded-By-Node"
+# Set on responses to tell which node built them
+SERVED_BY_HEADER = "X-Served-By-Node"
+# Carries CLUSTER_SECRET on forwarded requests
+CLUSTER_SECRET_HEADER = "X-Cluster-Secret"
+
+
+def ring_hash(key):
+    """Stable 64-bit hash, identical on every node and process"""
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def node_tag(node):
+    """Short stable name of a node, prefixed to the ids of jobs it runs"""
+    return f"{ring_hash(node):016x}"[:8]
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping keys onto nodes.
+
+    Every node is placed at `vnodes` points on the ring and a key belongs to
+    the first point at or after its hash. Adding or removing a node only moves
+    the keys between its points and their predecessors, about 1/N of them.
+    """
+
+    def __init__(self, nodes=(), vnodes=CLUSTER_VNODES):
+        self.vnodes = vnodes
+        # (sorted points, owner of each point), swapped as one so lookups never see a mix
+        self._ring = ([], [])
+        self.nodes = set()
+        self.set_nodes(nodes)
+
+    def set_nodes(self, nodes):
+        """Replace the membership, rebuilding the ring"""
+        points = sorted((ring_hash(f"{node}#{i}"), node) for node in set(nodes) for i in range(self.vnodes))
+        self._ring = ([point for point, _ in points], [node for _, node in points])
+        self.nodes = set(nodes)
+
+    def add(self, node):
+        self.set_nodes(self.nodes | {node})
+
+    def remove(self, node):
+        self.set_nodes(self.nodes - {node})
+
+    def node_for(self, key):
+        """Node owning a key, or None if the ring is empty"""
+        points, owners = self._ring
+        if not points:
+            return None
+        i = bisect.bisect_left(points, ring_hash(key))
+        return owners[i % len(owners)]
+
+
+class ClusterRouter:
+    """
+    Routes each company to the node that owns it, so its caches stay on one node.
+
+    With no cluster configured every company is served locally.
+    """
+
+    def __init__(self, nodes=CLUSTER_NODES, node_url=NODE_URL, vnodes=CLUSTER_VNODES,
+                 timeout=CLUSTER_FORWARD_TIMEOUT, secret=CLUSTER_SECRET):
+        self.node_url = node_url
+        self.tag = node_tag(node_url) if node_url else ""
+        self.timeout = timeout
+        self.secret = secret
+        self.ring = HashRing(nodes, vnodes)
+        self.forwarded = 0
+        self.forward_failures = 0
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+
+    def owner(self, company):
+        """Node URL to forward a company's requests to, or None to serve it here"""
+        node = self.ring.node_for(company.lower())
+        if node is None or node == self.node_url:
+            return None
+        return node
+
+    def node_for_tag(self, tag):
+        """Cluster node with the given tag, or None if it is this node or unknown"""
+        if not tag or tag == self.tag:
+            return None
+        for node in self.ring.nodes:
+            if node_tag(node) == tag:
+                return node
+        return None
+
+    def is_peer(self, headers):
+        """
+        Whether a request was forwarded by another node of the cluster.
+        
+        The forwarding node must be a cluster member and, when CLUSTER_SECRET is
+        set, the request must carry the secret. Without a secret anyone can claim
+        to be a node, so only trust this where clients cannot reach the nodes directly.
+        """
+        node = headers.get(FORWARDED_HEADER)
+        if not node or node.rstrip("/") not in self.ring.nodes:
+            return False
+        if self.secret is None:
+            return True
+        return hmac.compare_digest(headers.get(CLUSTER_SECRET_HEADER, ""), self.secret)
+
+    def set_nodes(self, nodes):
+        with self._lock:
+            self.ring.set_nodes([node.rstrip("/") for node in nodes])
+
+    def forward(self, node, path, body, headers, deadline=None, method="POST", params=None):
+        """
+        Send a request on to its owner node.
+
+        With a `deadline` the owner only gets what is left of the request's latency
+        budget, and is not waited for any longer than that.
+
+        Returns:
+            requests.Response: The owner's response, or None if it could not be reached
+        """
+        headers = dict(headers, **{FORWARDED_HEADER: self.node_url or "unknown"})
+        if self.secret is not None:
+            headers[CLUSTER_SECRET_HEADER] = self.secret
+        timeout = self.timeout
+        if deadline is not None:
+            body = dict(body, latency_budget_ms=max(1, int(deadline.remaining() * 1000)))
+            timeout = deadline.cap(timeout)
+        try:
+            response = self._session.request(method, node + path, json=body, params=params, headers=headers,
+                                             timeout=timeout)
+        except requests.RequestException as e:
+            print(f"Could not forward to {node}, serving locally: {str(e)}")
+            with self._lock:
+                self.forward_failures += 1
+            return None
+        with self._lock:
+            self.forwarded += 1
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            return {"Node": self.node_url or None, "Nodes": sorted(self.ring.nodes),
+                    "Virtual Nodes": self.ring.vnodes, "Forwarded": self.forwarded,
+                    "Forward Failures": self.forward_failures}
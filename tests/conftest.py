@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubUpstreams:
+    """
+    Local stand-in for NewsAPI, Google News and MyMemory with injectable faults.
+
+    `mode` is "ok", "error" (503) or "slow" (answers after `delay` seconds).
+    NewsAPI answers with the articles in `newsapi_articles`, filtered to those
+    mentioning a name in the query, and every request is logged in `calls`.
+    """
+
+    def __init__(self):
+        self.mode = "ok"
+        self.delay = 1.0
+        self.newsapi_articles = []
+        self.calls = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with stub._lock:
+                    stub.calls.append((url.path, params))
+                if stub.mode == "slow":
+                    time.sleep(stub.delay)
+                if stub.mode == "error":
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = stub.respond(url.path, params)
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    # The client gave up on a slow answer
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 64
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, path, params):
+        if path == "/newsapi":
+            query = params.get("q", "").lower()
+            articles = [article for article in self.newsapi_articles
+                        if any(word.strip('" ').lower() in (article["title"] + article["description"]).lower()
+                               for word in query.split(" or "))]
+            articles = articles[:int(params.get("pageSize", "100"))]
+            return json.dumps({"status": "ok", "articles": articles}).encode("utf-8")
+        if path == "/mymemory":
+            return json.dumps({"responseStatus": 200,
+                               "responseData": {"translatedText": "हिंदी"}}).encode("utf-8")
+        company = params.get("q", "").replace(" news", "")
+        items = "".join(f'<div class="SoaBEf"><a href="https://example.com/{i}">'
+                        f'<div role="heading">{company} headline {i}</div>'
+                        f'<div class="GI74Re">{company} summary {i}</div></a></div>'
+                        for i in range(10))
+        return f"<html><body>{items}</body></html>".encode("utf-8")
+
+    def count(self, path):
+        with self._lock:
+            return sum(1 for called, _ in self.calls if called == path)
+
+    def reset(self):
+        with self._lock:
+            self.mode = "ok"
+            self.delay = 1.0
+            self.newsapi_articles = []
+            self.calls = []
+
+
+# utils reads the upstream URLs at import, so the stub has to be up before any test imports it
+STUB = StubUpstreams()
+os.environ["NEWSAPI_URL"] = STUB.url + "/newsapi"
+os.environ["GOOGLE_NEWS_URL"] = STUB.url + "/google"
+os.environ["MYMEMORY_URL"] = STUB.url + "/mymemory"
+os.environ["NEWS_API_KEY"] = "test-key"
+os.environ["UPSTREAM_TIMEOUT"] = "0.3"
+
+
+@pytest.fixture
+def stub():
+    STUB.reset()
+    yield STUB
+    STUB.reset()
+
+
+@pytest.fixture
+def fresh_upstreams(monkeypatch):
+    """Fresh breakers that reopen quickly and an untouched quota ledger"""
+    import utils
+    from breakers import CircuitBreaker
+    from limits import QuotaLedger
+
+    for name in ("newsapi", "google", "mymemory", "gtts"):
+        monkeypatch.setitem(utils.breakers, name, CircuitBreaker(name, failure_threshold=2, reset_timeout=0.3))
+    ledger = QuotaLedger()
+    monkeypatch.setattr(utils, "quota_ledger", ledger)
+    return utils.breakers, ledger
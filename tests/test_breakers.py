@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+import utils
+from limits import QuotaLedger
+
+
+def trip(call, breaker, threshold=2):
+    """Fail `threshold` calls and check the circuit opened"""
+    for _ in range(threshold):
+        call()
+    assert breaker.state == "open"
+    assert breaker.trips == 1
+
+
+@pytest.mark.parametrize("mode", ["error", "slow"])
+def test_newsapi_breaker_cycle(stub, fresh_upstreams, mode):
+    breakers, _ = fresh_upstreams
+    breaker = breakers["newsapi"]
+    stub.newsapi_articles = [{"title": "Tesla rallies", "description": "Tesla shares rose",
+                              "content": "", "url": "https://example.com/tesla"}]
+
+    # 503s and answers slower than UPSTREAM_TIMEOUT both count as failures
+    stub.mode = mode
+    trip(lambda: utils.search_newsapi('"Tesla"', 10), breaker)
+    assert stub.count("/newsapi") == 2
+
+    # While open the fallback is immediate and the stub sees nothing
+    started = time.monotonic()
+    assert utils.search_newsapi('"Tesla"', 10) is None
+    assert time.monotonic() - started < 0.05
+    assert stub.count("/newsapi") == 2
+
+    # After the reset period concurrent callers let exactly one probe through
+    time.sleep(breaker.reset_timeout)
+    stub.mode = "slow"
+    stub.delay = 0.1
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(utils.search_newsapi('"Tesla"', 10)))
+               for _ in range(5)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert stub.count("/newsapi") == 3
+    assert sum(1 for result in results if result) == 1
+
+    # The successful probe closes the circuit
+    assert breaker.state == "closed"
+    stub.mode = "ok"
+    assert utils.search_newsapi('"Tesla"', 10)
+    assert stub.count("/newsapi") == 4
+
+
+def test_failed_probe_reopens(stub, fresh_upstreams):
+    breakers, _ = fresh_upstreams
+    breaker = breakers["mymemory"]
+    stub.mode = "error"
+    trip(lambda: utils.translate_to_hindi("Good news"), breaker)
+
+    time.sleep(breaker.reset_timeout)
+    utils.translate_to_hindi("Good news")
+    assert stub.count("/mymemory") == 3
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+
+    # Falls back to the untranslated text without calling the stub
+    assert "Good news" in utils.translate_to_hindi("Good news")
+    assert stub.count("/mymemory") == 3
+
+    time.sleep(breaker.reset_timeout)
+    stub.mode = "ok"
+    assert utils.translate_to_hindi("Good news") == "हिंदी"
+    assert breaker.state == "closed"
+
+
+def test_google_breaker_falls_back_to_mock(stub, fresh_upstreams):
+    breakers, _ = fresh_upstreams
+    breaker = breakers["google"]
+    # Longer than the pause between result pages, so no probe goes out mid-lookup
+    breaker.reset_timeout = 1.0
+    stub.mode = "error"
+
+    # One lookup walks the pages until the circuit opens, then fills in mock articles
+    articles = utils.get_articles_from_gnews("Tesla", 10)
+    assert len(articles) == 10
+    assert breaker.state == "open"
+    assert stub.count("/google") == 2
+
+    utils.get_articles_from_gnews("Tesla", 10)
+    assert stub.count("/google") == 2
+
+    time.sleep(breaker.reset_timeout)
+    stub.mode = "ok"
+    articles = utils.get_articles_from_gnews("Tesla", 10)
+    assert articles[0]["Title"] == "Tesla headline 0"
+    assert breaker.state == "closed"
+
+
+def test_probe_released_when_quota_is_exhausted(stub, fresh_upstreams, monkeypatch):
+    breakers, _ = fresh_upstreams
+    breaker = breakers["newsapi"]
+    stub.mode = "error"
+    trip(lambda: utils.search_newsapi('"Tesla"', 10), breaker)
+    time.sleep(breaker.reset_timeout)
+
+    # The probe is allowed but no quota is left, so it must not hold the circuit half-open
+    monkeypatch.setattr(utils, "quota_ledger", QuotaLedger({"newsapi": 0}))
+    assert utils.search_newsapi('"Tesla"', 10) is None
+    assert stub.count("/newsapi") == 2
+
+    monkeypatch.setattr(utils, "quota_ledger", QuotaLedger({"newsapi": 10}))
+    stub.mode = "ok"
+    utils.search_newsapi('"Tesla"', 10)
+    assert stub.count("/newsapi") == 3
+    assert breaker.state == "closed"
@@ -0,0 +1,129 @@
+import threading
+
+import utils
+from coalesce import QueryCoalescer, build_query, demultiplex, plan_queries
+from limits import QuotaLedger
+
+
+def article(title, url=None, description=""):
+    return {"title": title, "description": description, "content": "",
+            "url": url or "https://example.com/" + title.replace(" ", "-")}
+
+
+def fetch_concurrently(coalescer, requests):
+    """Call fetch from one thread per (company, count, priority) and collect the results"""
+    results = {}
+
+    def fetch(company, count, priority):
+        results[company] = coalescer.fetch(company, count, priority)
+
+    threads = [threading.Thread(target=fetch, args=request) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_plan_queries_respects_page_size():
+    groups = plan_queries({"Tesla": 40, "Apple": 40, "Nvidia": 40}, max_page_size=100)
+    assert groups == [["Tesla", "Apple"], ["Nvidia"]]
+
+
+def test_plan_queries_respects_query_length():
+    wanted = {f"Company {i}": 1 for i in range(10)}
+    groups = plan_queries(wanted, max_query_length=50)
+    assert [company for group in groups for company in group] == list(wanted)
+    assert all(len(build_query(group)) <= 50 for group in groups)
+    assert len(groups) > 1
+
+
+def test_plan_queries_caps_single_company_at_page_size():
+    assert plan_queries({"Tesla": 500, "Apple": 10}, max_page_size=100) == [["Tesla"], ["Apple"]]
+
+
+def test_demultiplex_assigns_articles_to_every_company_mentioned():
+    articles = [article("Tesla beats estimates"), article("Apple and Tesla team up"),
+                article("Pineapple prices fall"), article("Markets", description="apple rallies")]
+    matched = demultiplex(articles, ["Tesla", "Apple"])
+    assert [a["title"] for a in matched["Tesla"]] == ["Tesla beats estimates", "Apple and Tesla team up"]
+    # Whole words only, case-insensitive
+    assert [a["title"] for a in matched["Apple"]] == ["Apple and Tesla team up", "Markets"]
+
+
+def test_follow_up_for_companies_left_short():
+    queries = []
+
+    def search(query, page_size, priority):
+        queries.append((query, page_size))
+        if " OR " in query:
+            # A full page, all about Tesla
+            return [article(f"Tesla story {i}") for i in range(page_size)]
+        return [article(f"Apple story {i}") for i in range(page_size)]
+
+    coalescer = QueryCoalescer(search, window_ms=0, max_page_size=10)
+    results = coalescer._resolve({"Tesla": 5, "Apple": 5})
+    assert len(results["Tesla"]) == 5
+    assert [a["title"] for a in results["Apple"]] == [f"Apple story {i}" for i in range(5)]
+    assert queries == [('"Tesla" OR "Apple"', 10), ("Apple", 5)]
+    assert coalescer.stats()["Follow-up Queries"] == 1
+
+
+def test_no_follow_up_after_a_short_page():
+    queries = []
+
+    def search(query, page_size, priority):
+        queries.append(query)
+        return [article("Tesla story")]
+
+    coalescer = QueryCoalescer(search, window_ms=0, max_page_size=10)
+    results = coalescer._resolve({"Tesla": 5, "Apple": 5})
+    assert len(results["Tesla"]) == 1
+    assert results["Apple"] == []
+    assert len(queries) == 1
+
+
+def test_concurrent_callers_share_one_query(stub, fresh_upstreams):
+    stub.newsapi_articles = ([article(f"Tesla story {i}") for i in range(3)]
+                             + [article(f"Apple story {i}") for i in range(3)]
+                             + [article(f"Nvidia story {i}") for i in range(3)])
+    coalescer = QueryCoalescer(utils.search_newsapi, window_ms=200)
+
+    results = fetch_concurrently(coalescer, [("Tesla", 2, "interactive"), ("Apple", 3, "interactive"),
+                                             ("Nvidia", 1, "interactive")])
+    assert stub.count("/newsapi") == 1
+    assert [a["title"] for a in results["Tesla"]] == ["Tesla story 0", "Tesla story 1"]
+    assert [a["title"] for a in results["Apple"]] == [f"Apple story {i}" for i in range(3)]
+    assert [a["title"] for a in results["Nvidia"]] == ["Nvidia story 0"]
+
+
+def test_lookups_reserve_quota_at_their_callers_priority(stub, fresh_upstreams, monkeypatch):
+    stub.newsapi_articles = [article("Tesla story"), article("Apple story")]
+    # Down to the low-water mark, only interactive requests may spend what is left
+    ledger = QuotaLedger({"newsapi": 10}, low_water=0.5)
+    for _ in range(5):
+        ledger.reserve("newsapi", "interactive")
+    monkeypatch.setattr(utils, "quota_ledger", ledger)
+    coalescer = QueryCoalescer(utils.search_newsapi, window_ms=200)
+
+    results = fetch_concurrently(coalescer, [("Tesla", 1, "background"), ("Apple", 1, "interactive")])
+    assert results["Tesla"] is None
+    assert [a["title"] for a in results["Apple"]] == ["Apple story"]
+    assert stub.count("/newsapi") == 1
+    assert ledger.remaining("newsapi") == 4
+
+
+def test_profiled_requests_query_on_their_own_thread(stub, fresh_upstreams, monkeypatch):
+    from profiling import profile_call
+    stub.newsapi_articles = [article("Tesla story")]
+    threads = []
+
+    def search(query, page_size, priority):
+        threads.append(threading.get_ident())
+        return utils.search_newsapi(query, page_size, priority)
+
+    monkeypatch.setattr(utils, "_newsapi_coalescer", QueryCoalescer(search, window_ms=200))
+    articles, report = profile_call("Tesla", utils.get_company_articles, "Tesla", 1)
+    assert [a["Title"] for a in articles] == ["Tesla story"]
+    assert threads == [threading.get_ident()]
+    assert report["Stage ms"]["network"] > 0
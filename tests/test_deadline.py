@@ -0,0 +1,47 @@
+import time
+
+import utils
+from deadline import Deadline, request_deadline
+
+
+def test_newsapi_lookup_gives_up_at_the_deadline(stub, fresh_upstreams, monkeypatch):
+    stub.mode = "slow"
+    stub.delay = 1.0
+    monkeypatch.setattr(utils, "UPSTREAM_TIMEOUT", 5.0)
+    deadline = Deadline(300)
+    token = request_deadline.set(deadline)
+    try:
+        started = time.monotonic()
+        articles = utils.get_company_articles("Tesla", 5)
+    finally:
+        request_deadline.reset(token)
+
+    # No time is left for Google, mock articles fill in
+    assert time.monotonic() - started < 0.6
+    assert len(articles) == 5
+    assert stub.count("/google") == 0
+    assert deadline.degraded["articles"] == "mock"
+
+
+def test_budget_timeouts_do_not_trip_the_breaker(stub, fresh_upstreams, monkeypatch):
+    breakers, _ = fresh_upstreams
+    stub.mode = "slow"
+    monkeypatch.setattr(utils, "UPSTREAM_TIMEOUT", 5.0)
+    for _ in range(3):
+        token = request_deadline.set(Deadline(100))
+        try:
+            assert utils.search_newsapi('"Tesla"', 5) is None
+        finally:
+            request_deadline.reset(token)
+    assert breakers["newsapi"].state == "closed"
+
+
+def test_degraded_responses_are_not_cacheable():
+    import api
+    from cache import CachedResponse
+
+    full = api.cached_response(CachedResponse("Tesla", 5, "abc", {"Company": "Tesla"}))
+    assert full.headers["Cache-Control"].startswith("public, max-age=")
+
+    degraded = CachedResponse("Tesla", 5, "abc", {"Company": "Tesla", "Degraded Stages": {"tts": "skipped"}})
+    assert api.cached_response(degraded).headers["Cache-Control"] == "no-store"
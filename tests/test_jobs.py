@@ -0,0 +1,43 @@
+import time
+
+from jobs import JobFailed, JobStore
+
+
+def wait_until_finished(store, job):
+    for _ in range(200):
+        if store.get(job.id).is_finished():
+            return store.get(job.id)
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_stages_left_pending_are_cached_on_success():
+    store = JobStore(workers=1)
+
+    def run(progress):
+        progress("articles", "done")
+        return {"Company": "Tesla"}
+
+    job = wait_until_finished(store, store.submit(run, {}, ["articles", "sentiment"]))
+    assert job.snapshot()["Progress"] == {"articles": "done", "sentiment": "cached"}
+
+
+def test_stages_left_pending_are_skipped_on_failure():
+    store = JobStore(workers=1)
+
+    def run(progress):
+        progress("articles", "done")
+        raise JobFailed(404, "Could not find news articles for Tesla")
+
+    job = wait_until_finished(store, store.submit(run, {}, ["articles", "sentiment", "comparative"]))
+    snapshot = job.snapshot()
+    assert snapshot["Status"] == "failed"
+    assert snapshot["Error"] == {"Status Code": 404, "Detail": "Could not find news articles for Tesla"}
+    assert snapshot["Progress"] == {"articles": "done", "sentiment": "skipped", "comparative": "skipped"}
+
+
+def test_oldest_finished_jobs_are_evicted():
+    store = JobStore(workers=1, max_finished=2)
+    jobs = [wait_until_finished(store, store.submit(lambda progress: {}, {}, [])) for _ in range(3)]
+    assert store.get(jobs[0].id) is None
+    assert all(store.get(job.id) is not None for job in jobs[1:])
@@ -0,0 +1,54 @@
+import pytest
+from textblob import TextBlob
+
+from lexicon import SentimentLexicon
+from utils import generate_mock_articles
+
+
+EDGE_CASES = [
+    # Negation flips and damps the next sentiment word
+    "The results were not good.",
+    "This is never a bad sign.",
+    "Sales aren't great and profits didn't improve.",
+    "No growth, no profit.",
+    # Modifiers scale the word after them
+    "A very good quarter with extremely strong demand.",
+    "The outlook is not very bad.",
+    "Really really terrible guidance!",
+    # Exclamation marks and emoticons
+    "Great news!",
+    "Great news!!!",
+    "Profits rose (!) despite the recession.",
+    "Stock is up :) but margins are down :(",
+    "What a day :-D",
+    "Earnings missed ;) again",
+    # Mixed case, abbreviations and punctuation
+    "U.S. regulators approved the deal. Mr. Smith was happy.",
+    "BEST. QUARTER. EVER.",
+    "",
+    "   ",
+    "12% increase in revenue, $4.2 billion deal.",
+]
+
+
+def mock_texts():
+    texts = []
+    for company in ("Tesla", "Apple", "Microsoft"):
+        for article in generate_mock_articles(company, 20):
+            texts.extend([article["Title"], article["Summary"], f"{article['Title']}. {article['Summary']}"])
+    return texts
+
+
+@pytest.fixture(scope="module")
+def lexicon(tmp_path_factory):
+    return SentimentLexicon(str(tmp_path_factory.mktemp("lexicon") / "en-sentiment.bin"))
+
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_edge_cases_match_textblob(lexicon, text):
+    assert lexicon.polarity(text) == TextBlob(text).sentiment.polarity
+
+
+def test_mock_articles_match_textblob(lexicon):
+    mismatches = [text for text in mock_texts() if lexicon.polarity(text) != TextBlob(text).sentiment.polarity]
+    assert mismatches == []
@@ -0,0 +1,34 @@
+import pytest
+
+import api
+import sentiment
+from sentiment import MicroBatcher, SentimentBackend
+from utils import generate_mock_articles
+
+
+class BrokenBackend(SentimentBackend):
+    name = "broken"
+
+    def __init__(self, batched):
+        self.batched = batched
+
+    def predict_batch(self, texts):
+        raise IndexError("list index out of range")
+
+
+class ShortBackend(SentimentBackend):
+    name = "short"
+    batched = False
+
+    def predict_batch(self, texts):
+        return ["Positive"] * (len(texts) - 1)
+
+
+@pytest.mark.parametrize("backend", [BrokenBackend(batched=False), BrokenBackend(batched=True), ShortBackend()])
+def test_failing_backend_falls_back_to_keywords(backend, monkeypatch):
+    monkeypatch.setattr(sentiment, "_scheduler", MicroBatcher(backend, max_wait_ms=1))
+    articles = generate_mock_articles("Tesla", 4)
+
+    response = api.run_analysis("Tesla", 4, include=["articles", "sentiment_distribution"], articles=articles)
+    assert response["Degraded Stages"] == {"sentiment": "keyword"}
+    assert all(article["Sentiment"] in ("Positive", "Negative", "Neutral") for article in response["Articles"])
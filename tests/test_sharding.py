@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from starlette.requests import Request
+
+import api
+from api import CompanyRequest, forward_to_owner
+from sharding import FORWARDED_HEADER, SERVED_BY_HEADER, ClusterRouter, HashRing
+
+
+SELF = "http://127.0.0.1:1"
+COMPANIES = [f"Company {i}" for i in range(2000)]
+
+
+class StubNode:
+    """An owner node that answers every forwarded request and records what it got"""
+
+    def __init__(self):
+        self.requests = []
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                node.requests.append((self.path, dict(self.headers), body))
+                payload = json.dumps({"Company": body["company_name"]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_node():
+    node = StubNode()
+    yield node
+    node.close()
+
+
+def http_request(headers=None):
+    headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "POST", "path": "/analyze", "headers": headers,
+                    "client": ("10.0.0.9", 5000)})
+
+
+def owned_by(router, node):
+    return next(company for company in COMPANIES if router.ring.node_for(company.lower()) == node)
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    ring = HashRing(["http://a", "http://b", "http://c"])
+    before = {company: ring.node_for(company) for company in COMPANIES}
+    ring.add("http://d")
+    moved = {company for company in COMPANIES if ring.node_for(company) != before[company]}
+
+    assert moved
+    assert all(ring.node_for(company) == "http://d" for company in moved)
+    # About a quarter of the keys move to the fourth node
+    assert 0.15 < len(moved) / len(COMPANIES) < 0.35
+
+    ring.remove("http://d")
+    assert {company: ring.node_for(company) for company in COMPANIES} == before
+
+
+def test_request_is_forwarded_to_its_owner(stub_node, monkeypatch):
+    router = ClusterRouter([SELF, stub_node.url], node_url=SELF)
+    monkeypatch.setattr(api, "cluster_router", router)
+    company = owned_by(router, stub_node.url)
+
+    response = asyncio.run(forward_to_owner(CompanyRequest(company_name=company), http_request(), "/analyze"))
+    assert response.status_code == 200
+    assert json.loads(response.body) == {"Company": company}
+    assert response.headers[SERVED_BY_HEADER] == stub_node.url
+
+    path, headers, _ = stub_node.requests[0]
+    assert path == "/analyze"
+    assert headers[FORWARDED_HEADER] == SELF
+    assert headers["X-Client-Id"] == "10.0.0.9"
+    # Companies this node owns are served here
+    assert asyncio.run(forward_to_owner(CompanyRequest(company_name=owned_by(router, SELF)),
+                                        http_request(), "/analyze")) is None
+
+
+def test_forwarded_request_is_not_forwarded_again(stub_node, monkeypatch):
+    router = ClusterRouter([SELF, stub_node.url], node_url=SELF)
+    monkeypatch.setattr(api, "cluster_router", router)
+    company = owned_by(router, stub_node.url)
+
+    forwarded = http_request({FORWARDED_HEADER: "http://127.0.0.1:2"})
+    assert asyncio.run(forward_to_owner(CompanyRequest(company_name=company), forwarded, "/analyze")) is None
+    assert stub_node.requests == []
+
+
+def test_unreachable_owner_falls_back_to_serving_locally(stub_node, monkeypatch):
+    router = ClusterRouter([SELF, stub_node.url], node_url=SELF, timeout=1)
+    monkeypatch.setattr(api, "cluster_router", router)
+    company = owned_by(router, stub_node.url)
+    stub_node.close()
+
+    assert asyncio.run(forward_to_owner(CompanyRequest(company_name=company), http_request(), "/analyze")) is None
+    assert router.forward_failures == 1
@@ -0,0 +1,211 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from gtts import gTTS
+from utils import HINDI_COMPANY_NAMES, translate_advice
+from limits import quota_ledger
+from breakers import breakers
+
+
+# "full" synthesizes every summary through gTTS, "template" stitches pre-synthesized fragments
+TTS_MODE = os.environ.get("TTS_MODE", "full")
+# Where synthesized fragments are kept between restarts
+TTS_SEGMENT_DIR = os.environ.get(
+    "TTS_SEGMENT_DIR", os.path.join(tempfile.gettempdir(), "news_tts_segments"))
+# Article counts up to this number are synthesized ahead of time
+TTS_MAX_PRESYNTH_NUMBER = int(os.environ.get("TTS_MAX_PRESYNTH_NUMBER", "20"))
+
+# Hindi for the overall sentiment labels of generate_final_sentiment
+HINDI_OVERALL = {
+    "strongly positive": "अत्यधिक सकारात्मक",
+    "mostly positive": "अधिकतर सकारात्मक",
+    "strongly negative": "अत्यधिक नकारात्मक",
+    "mostly negative": "अधिकतर नकारात्मक",
+    "mixed": "मिश्रित"
+}
+
+# Fixed pieces of the summary template, in sentence order
+COVERAGE_PHRASE = "की ताज़ा समाचार कवरेज"
+IS_PHRASE = "है"
+POSITIVE_PHRASE = "सकारात्मक"
+NEGATIVE_PHRASE = "नकारात्मक"
+NEUTRAL_PHRASE = "तटस्थ लेख"
+
+OUTLOOKS = ["Strong growth potential indicated.", "Potential growth expected.",
+            "Significant challenges ahead.", "Caution advised.", "Situation requires monitoring."]
+
+# Synthesized MP3 fragments by text
+_segments = {}
+_segments_lock = threading.Lock()
+# Fragments requests found missing, waiting for the background synthesizer
+_queued = []
+_queue_thread = None
+
+
+def build_hindi_summary(company_name, overall, outlook, sentiment_dist):
+    """
+    Build the Hindi summary from the template fragments.
+
+    Args:
+        company_name (str): Company the summary is about
+        overall (str): Overall sentiment label, e.g. "mostly positive"
+        outlook (str): Outlook sentence in English
+        sentiment_dist (dict): Positive/Negative/Neutral article counts
+
+    Returns:
+        tuple: (Hindi text, list of fragments to stitch), or None if the
+        company has no known Hindi name and needs full synthesis
+    """
+    company_hi = HINDI_COMPANY_NAMES.get(company_name)
+    if company_hi is None:
+        return None
+
+    overall_hi = HINDI_OVERALL[overall]
+    outlook_hi = translate_advice(outlook)
+    positive = str(sentiment_dist["Positive"])
+    negative = str(sentiment_dist["Negative"])
+    neutral = str(sentiment_dist["Neutral"])
+
+    text = (f"{company_hi} {COVERAGE_PHRASE} {overall_hi} {IS_PHRASE} "
+            f"({positive} {POSITIVE_PHRASE}, {negative} {NEGATIVE_PHRASE}, {neutral} {NEUTRAL_PHRASE})। "
+            f"{outlook_hi}")
+    segments = [company_hi, COVERAGE_PHRASE, overall_hi, IS_PHRASE,
+                positive, POSITIVE_PHRASE, negative, NEGATIVE_PHRASE, neutral, NEUTRAL_PHRASE,
+                outlook_hi]
+    return text, segments
+
+
+def _segment_path(text):
+    return os.path.join(TTS_SEGMENT_DIR, hashlib.sha1(text.encode("utf-8")).hexdigest() + ".mp3")
+
+
+def get_segment(text, synthesize=True):
+    """
+    Return the MP3 audio for one fragment, synthesizing and storing it on first use.
+
+    Args:
+        text (str): Fragment text
+        synthesize (bool): Call gTTS for fragments not stored yet, otherwise return None for them
+
+    Returns:
+        bytes: MP3 frames, or None if the fragment could not be synthesized
+    """
+    with _segments_lock:
+        audio = _segments.get(text)
+    if audio is not None:
+        return audio
+
+    path = _segment_path(text)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            audio = f.read()
+    elif not synthesize:
+        return None
+    else:
+        audio = _synthesize(text)
+        if audio is None:
+            return None
+        # Write to a temporary name first so readers never see a partial file
+        os.makedirs(TTS_SEGMENT_DIR, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=TTS_SEGMENT_DIR, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(temp_path, path)
+
+    with _segments_lock:
+        _segments[text] = audio
+    return audio
+
+
+def _synthesize(text):
+    """Synthesize one fragment through gTTS, respecting the breaker and quota"""
+    if not breakers["gtts"].allow():
+        return None
+    if not quota_ledger.reserve("gtts", "background"):
+        breakers["gtts"].release()
+        return None
+    try:
+        buffer = io.BytesIO()
+        gTTS(text=text, lang='hi', slow=False).write_to_fp(buffer)
+        breakers["gtts"].record_success()
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"Error synthesizing TTS segment: {str(e)}")
+        breakers["gtts"].record_failure()
+        return None
+
+
+def stitch_segments(segments):
+    """
+    Concatenate pre-synthesized fragments into one audio clip.
+
+    gTTS returns MP3, whose frames decode independently, so the fragments are
+    joined as they are instead of being decoded to PCM first. Only stored
+    fragments are used: synthesizing the missing ones one by one would be slower
+    than synthesizing the whole summary, so they are queued for the background
+    synthesizer and the caller falls back to full synthesis this time.
+
+    Returns:
+        bytes: MP3 audio, or None if any fragment is not stored yet
+    """
+    parts = []
+    missing = []
+    for text in segments:
+        audio = get_segment(text, synthesize=False)
+        if audio is None:
+            missing.append(text)
+        else:
+            parts.append(audio)
+    if missing:
+        queue_segments(missing)
+        return None
+    return b"".join(parts)
+
+
+def queue_segments(texts):
+    """Have fragments synthesized in the background, for the requests that come after"""
+    global _queue_thread
+    with _segments_lock:
+        for text in texts:
+            if text not in _segments and text not in _queued:
+                _queued.append(text)
+        if _queued and _queue_thread is None:
+            _queue_thread = threading.Thread(target=_synthesize_queued, daemon=True, name="tts-segments")
+            _queue_thread.start()
+
+
+def _synthesize_queued():
+    global _queue_thread
+    while True:
+        with _segments_lock:
+            if not _queued:
+                _queue_thread = None
+                return
+            text = _queued[0]
+        # A failed fragment is dropped, the next request that needs it queues it again
+        get_segment(text)
+        with _segments_lock:
+            _queued.remove(text)
+
+
+def template_fragments():
+    """Every fragment the summary template can produce for known companies"""
+    fragments = [COVERAGE_PHRASE, IS_PHRASE, POSITIVE_PHRASE, NEGATIVE_PHRASE, NEUTRAL_PHRASE]
+    fragments.extend(HINDI_OVERALL.values())
+    fragments.extend(translate_advice(outlook) for outlook in OUTLOOKS)
+    fragments.extend(str(n) for n in range(TTS_MAX_PRESYNTH_NUMBER + 1))
+    fragments.extend(HINDI_COMPANY_NAMES.values())
+    return fragments
+
+
+def warm_segments():
+    """Synthesize every template fragment ahead of time so requests never wait on gTTS"""
+    missing = 0
+    for text in template_fragments():
+        if get_segment(text) is None:
+            missing += 1
+    if missing:
+        print(f"TTS warm-up finished with {missing} fragments unavailable")
+    return missing
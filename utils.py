@@ -1,12 +1,54 @@
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 import re
 import random
 import os
-import tempfile
+import io
+import shutil
+import subprocess
+import threading
+import wave
 import numpy as np
 from gtts import gTTS
 import time
+from limits import quota_ledger, request_priority
+from breakers import breakers
+from coalesce import QueryCoalescer
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from lexicon import get_lexicon, keyword_sentiment
+from deadline import request_deadline
+from profiling import profiling_active
+
+
+# Placeholder key shipped with the repo, treated as "no key configured"
+FALLBACK_NEWS_API_KEY = "0954c90510554c12b5cde5dbb55e7e9f"
+
+# Upstream endpoints, overridable to point at local stub servers
+NEWSAPI_URL = os.environ.get("NEWSAPI_URL", "https://newsapi.org/v2/everything")
+GOOGLE_NEWS_URL = os.environ.get("GOOGLE_NEWS_URL", "https://www.google.com/search")
+MYMEMORY_URL = os.environ.get("MYMEMORY_URL", "https://api.mymemory.translated.net/get")
+
+# Seconds to wait for any upstream before counting the call as failed
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "5"))
+
+
+def upstream_timeout():
+    """UPSTREAM_TIMEOUT, shortened to what is left of the current request's latency budget"""
+    deadline = request_deadline.get()
+    return UPSTREAM_TIMEOUT if deadline is None else deadline.cap(UPSTREAM_TIMEOUT)
+
+
+def budget_spent():
+    """Whether the current request ran out of budget, so a timeout is not the upstream's fault"""
+    deadline = request_deadline.get()
+    return deadline is not None and deadline.remaining() < 0.05
+
+
+def mark_degraded(stage, how):
+    """Note on the current request's deadline that a stage was cut short to fit the budget"""
+    deadline = request_deadline.get()
+    if deadline is not None:
+        deadline.degrade(stage, how)
 
 
 def analyze_sentiment(text):
@@ -20,12 +62,8 @@ def analyze_sentiment(text):
         str: Sentiment label ("Positive", "Negative", or "Neutral")
     """
     try:
-        # Use TextBlob for sentiment analysis as it doesn't require API keys
-        from textblob import TextBlob
-
-        analysis = TextBlob(text)
-        # Get the polarity score
-        polarity = analysis.sentiment.polarity
+        # TextBlob's scoring, read from the shared memory-mapped lexicon
+        polarity = get_lexicon().polarity(text)
 
         # Determine sentiment based on polarity
         if polarity > 0.1:
@@ -38,26 +76,7 @@ def analyze_sentiment(text):
     except Exception as e:
         print(f"Error in sentiment analysis: {str(e)}")
         # Fallback to a simple keyword-based approach
-        positive_words = ["success", "profit", "growth", "increase", "improved", "rise",
-                          "strong", "exceed", "exceed", "optimistic", "positive", "advantage"]
-        negative_words = ["decline", "loss", "down", "fell", "fall", "drop", "struggle",
-                          "concern", "risk", "warning", "negative", "problem", "issue", "fail"]
-
-        text_lower = text.lower()
-
-        # Count occurrences of positive and negative words
-        positive_count = sum(
-            1 for word in positive_words if word in text_lower)
-        negative_count = sum(
-            1 for word in negative_words if word in text_lower)
-
-        # Determine sentiment based on counts
-        if positive_count > negative_count:
-            return "Positive"
-        elif negative_count > positive_count:
-            return "Negative"
-        else:
-            return "Neutral"
+        return keyword_sentiment(text)
 
 
 def clean_text(text):
@@ -71,6 +90,46 @@ def clean_text(text):
     return text
 
 
+def extract_topics(text):
+    """Extract key topics from text"""
+    topics = []
+    keywords = {
+        "stock": "Stock Market",
+        "revenue": "Financial",
+        "profit": "Financial",
+        "sales": "Sales",
+        "product": "Product",
+        "innovation": "Innovation",
+        "tech": "Technology",
+        "regulation": "Regulation",
+        "legal": "Legal",
+        "expansion": "Expansion",
+        "growth": "Growth",
+        "market": "Market",
+        "customer": "Customer Relations",
+        "launch": "Product Launch",
+        "research": "Research & Development",
+        "invest": "Investment",
+        "competition": "Competition",
+        "partnership": "Partnership",
+        "acquisition": "Acquisition",
+        "merger": "Merger",
+        "fiscal": "Financial",
+        "quarterly": "Quarterly Report",
+        "annual": "Annual Report"
+    }
+
+    for keyword, topic in keywords.items():
+        if keyword.lower() in text.lower() and topic not in topics:
+            topics.append(topic)
+
+    # Add default topic if none found
+    if not topics:
+        topics = ["Business News"]
+
+    return topics[:3]  # Limit to top 3 topics
+
+
 def generate_summary(text, max_length=200):
     """
     Generate a summary of the text
@@ -105,62 +164,147 @@ def get_company_articles(company_name, num_articles=10):
     try:
         # Try using NewsAPI
         # Replace with your actual API key
-        api_key = os.environ.get(
-            "NEWS_API_KEY", "0954c90510554c12b5cde5dbb55e7e9f")
+        api_key = get_news_api_key()
 
         # If API key is not set, try to get from environment or use fallback
-        if api_key == "0954c90510554c12b5cde5dbb55e7e9f":
+        if api_key is None:
             # You should set this environment variable
             print("WARNING: Using fallback API or mock data as NEWS_API_KEY is not set")
             # Try alternative free API or use fallback
             return get_articles_from_gnews(company_name, num_articles)
 
-        url = f"https://newsapi.org/v2/everything?q={company_name}&language=en&sortBy=publishedAt&pageSize={num_articles}"
-        headers = {"X-Api-Key": api_key}
+        # Companies requested at about the same time share NewsAPI queries
+        deadline = request_deadline.get()
+        try:
+            # Profiled requests query on their own thread, so the profiler sees the network stage
+            raw_articles = get_newsapi_coalescer().fetch(company_name, num_articles, request_priority.get(),
+                                                         timeout=deadline.remaining() if deadline else None,
+                                                         inline=profiling_active.get())
+        except FutureTimeoutError:
+            # The lookup is still running for the other callers, this request cannot wait for it
+            print(f"NewsAPI lookup for {company_name} outlasted the latency budget")
+            mark_degraded("articles", "newsapi timed out")
+            return get_articles_from_gnews(company_name, num_articles)
+        if raw_articles is None:
+            return get_articles_from_gnews(company_name, num_articles)
+        if not raw_articles:
+            print(f"No NewsAPI articles found for {company_name}")
+            return get_articles_from_gnews(company_name, num_articles)
 
-        response = requests.get(url, headers=headers)
+        return [newsapi_article(article) for article in raw_articles]
 
-        if response.status_code == 200:
-            data = response.json()
+    except Exception as e:
+        print(f"Error in get_company_articles: {str(e)}")
+        # Final fallback to mock data if all else fails
+        return generate_mock_articles(company_name, num_articles)
 
-            if data["status"] == "ok" and data["totalResults"] > 0:
-                articles = []
 
-                for article in data["articles"][:num_articles]:
-                    # Extract and process article data
-                    title = article.get("title", "")
-                    description = article.get("description", "")
-                    content = article.get("content", "")
+def search_newsapi(query, page_size, priority=None):
+    """
+    Run one NewsAPI query.
 
-                    # Generate summary
-                    text_for_summary = content if content else description
-                    summary = generate_summary(
-                        text_for_summary, 200) if text_for_summary else description
+    Args:
+        query (str): NewsAPI `q` value, possibly covering several companies
+        page_size (int): Number of articles to request
+        priority (str): Priority to reserve quota at, defaults to the current request's
 
-                    # Clean the text
-                    title = clean_text(title)
-                    summary = clean_text(summary)
+    Returns:
+        list: Raw NewsAPI articles, or None if NewsAPI could not be used
+    """
+    # Skip straight to the fallback while NewsAPI is failing
+    if not breakers["newsapi"].allow():
+        print("NewsAPI circuit open, falling back to Google News")
+        return None
 
-                    # Create article object
-                    article_obj = {
-                        "Title": title,
-                        "Summary": summary,
-                        "URL": article.get("url", ""),
-                    }
+    # Keep the NewsAPI quota for requests that still have budget left
+    if not quota_ledger.reserve("newsapi", priority):
+        breakers["newsapi"].release()
+        print("NewsAPI quota exhausted, falling back to Google News")
+        return None
 
-                    articles.append(article_obj)
+    params = {"q": query, "language": "en", "sortBy": "publishedAt", "pageSize": page_size}
+    headers = {"X-Api-Key": get_news_api_key()}
 
-                return articles
+    try:
+        response = requests.get(NEWSAPI_URL, params=params, headers=headers, timeout=upstream_timeout())
+    except requests.RequestException as e:
+        print(f"NewsAPI request failed: {str(e)}")
+        if not budget_spent():
+            breakers["newsapi"].record_failure()
+        else:
+            # Our budget ran out, not the upstream, so any probe is left for someone else
+            breakers["newsapi"].release()
+        return None
 
-        # If we got here, something went wrong with the API call
+    if response.status_code != 200:
         print(f"Error fetching articles: {response.status_code}")
-        # Fallback to alternative methods
-        return get_articles_from_gnews(company_name, num_articles)
+        breakers["newsapi"].record_failure()
+        return None
+
+    breakers["newsapi"].record_success()
+    data = response.json()
+    if data.get("status") != "ok":
+        return None
+    return data.get("articles") or []
+
+
+def newsapi_article(article):
+    """Turn a raw NewsAPI article into the title, summary and URL the pipeline uses"""
+    title = article.get("title") or ""
+    description = article.get("description") or ""
+    content = article.get("content") or ""
+
+    # Generate summary
+    text_for_summary = content if content else description
+    summary = generate_summary(
+        text_for_summary, 200) if text_for_summary else description
+
+    return {
+        "Title": clean_text(title),
+        "Summary": clean_text(summary),
+        "URL": article.get("url", ""),
+    }
 
-    except Exception as e:
-        print(f"Error in get_company_articles: {str(e)}")
-        # Final fallback to mock data if all else fails
-        return generate_mock_articles(company_name, num_articles)
+
+_newsapi_coalescer = None
+_newsapi_coalescer_lock = threading.Lock()
+
+
+def get_newsapi_coalescer():
+    """Shared NewsAPI query coalescer, created on first use"""
+    global _newsapi_coalescer
+    with _newsapi_coalescer_lock:
+        if _newsapi_coalescer is None:
+            _newsapi_coalescer = QueryCoalescer(search_newsapi)
+        return _newsapi_coalescer
+
+
+def get_news_api_key():
+    """Return the configured NewsAPI key, or None if only the placeholder is available"""
+    api_key = os.environ.get("NEWS_API_KEY", FALLBACK_NEWS_API_KEY)
+    return None if api_key == FALLBACK_NEWS_API_KEY else api_key
+
+
+def article_upstream():
+    """Name of the upstream get_company_articles will try first"""
+    return "newsapi" if get_news_api_key() else "google"
+
+
+def release_soup(soup):
+    """
+    Tear down a parse tree now instead of leaving it to the cycle collector.
+
+    Every element links to its parent and neighbours, so without this a page's
+    tree stays allocated until the next garbage collection. BeautifulSoup's own
+    decompose() stops at the root, whose next_element is None, so the top-level
+    children are decomposed one by one.
+    """
+    for child in list(soup.contents):
+        if isinstance(child, Tag):
+            child.decompose()
+        else:
+            child.extract()
+    soup.decompose()
 
 
 def get_articles_from_gnews(company_name, num_articles=10):
@@ -175,18 +319,50 @@ def get_articles_from_gnews(company_name, num_articles=10):
         max_attempts = 3  # Try up to 3 pages
 
         while len(articles) < num_articles and page < max_attempts:
+            # Stop scraping while Google is failing, mock data fills the rest
+            if not breakers["google"].allow():
+                print("Google News circuit open, using mock data for the rest")
+                break
+            # Another page would outlast the request's latency budget
+            if budget_spent():
+                mark_degraded("articles", "mock")
+                break
+
+            # Stop scraping once the Google budget is used up, mock data fills the rest
+            if not quota_ledger.reserve("google"):
+                breakers["google"].release()
+                print("Google News quota exhausted, using mock data for the rest")
+                break
+
             # Add page parameter for subsequent searches
             start_param = f"&start={page*10}" if page > 0 else ""
-            url = f"https://www.google.com/search?q={company_name}+news&tbm=nws{start_param}"
+            url = f"{GOOGLE_NEWS_URL}?q={company_name}+news&tbm=nws{start_param}"
 
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
 
-            response = requests.get(url, headers=headers)
+            try:
+                response = requests.get(url, headers=headers, timeout=upstream_timeout())
+            except requests.RequestException as e:
+                print(f"Google News request failed: {str(e)}")
+                if not budget_spent():
+                    breakers["google"].record_failure()
+                else:
+                    # Our budget ran out, not the upstream, so any probe is left for someone else
+                    breakers["google"].release()
+                break
+
+            if response.status_code != 200:
+                # Usually a block (429) or an outage, either way stop hammering Google
+                breakers["google"].record_failure()
+            else:
+                breakers["google"].record_success()
 
             if response.status_code == 200:
                 soup = BeautifulSoup(response.text, 'html.parser')
+                # The tree has its own copy of the page, the raw response is not needed any more
+                del response
 
                 # Extract news items - try different class names as Google may change them
                 news_divs = soup.find_all('div', {'class': 'SoaBEf'})
@@ -202,6 +378,7 @@ def get_articles_from_gnews(company_name, num_articles=10):
                     potential_news_divs = soup.find_all('div')
                     news_divs = [div for div in potential_news_divs if div.find(
                         'div', {'role': 'heading'})]
+                    del potential_news_divs
 
                 for div in news_divs:
                     try:
@@ -253,6 +430,10 @@ def get_articles_from_gnews(company_name, num_articles=10):
                         print(f"Error extracting article: {str(inner_e)}")
                         continue
 
+                del news_divs
+                release_soup(soup)
+                del soup
+
             # Move to the next page
             page += 1
             # Add a small delay to avoid being blocked
@@ -414,8 +595,9 @@ def perform_comparative_analysis(articles):
             topics1 = set(article1.get("Topics", []))
             topics2 = set(article2.get("Topics", []))
 
-            unique_topics1 = list(topics1 - topics2)
-            unique_topics2 = list(topics2 - topics1)
+            # Sorted so the output (and its ETag) is identical across processes
+            unique_topics1 = sorted(topics1 - topics2)
+            unique_topics2 = sorted(topics2 - topics1)
 
             comparison = {
                 "Comparison": f"Article {i+1} focuses on {', '.join(unique_topics1) if unique_topics1 else 'general news'}, "
@@ -431,9 +613,11 @@ def perform_comparative_analysis(articles):
         "Coverage Differences": coverage_differences,
         "Topic Overlap": {
             "Common Topics": common_topics if common_topics else ["No common topics found"],
-            "Unique Topics in Article 1": list(set(articles[0].get("Topics", []))) if articles else [],
-            "Unique Topics in Article 2": list(set(articles[1].get("Topics", []))) if len(articles) > 1 else []
-        }
+            "Unique Topics in Article 1": sorted(set(articles[0].get("Topics", []))) if articles else [],
+            "Unique Topics in Article 2": sorted(set(articles[1].get("Topics", []))) if len(articles) > 1 else []
+        },
+        # Most frequent first, so clients can chart it without recounting
+        "Topic Frequency": dict(sorted(topic_frequency.items(), key=lambda item: (-item[1], item[0])))
     }
 
     return comparative_analysis
@@ -461,8 +645,17 @@ def translate_to_hindi(text):
     try:
         import requests
 
+        if not breakers["mymemory"].allow():
+            print("Translation circuit open, skipping translation")
+            return f"{text} (अनुवाद उपलब्ध नहीं है)"
+
+        if not quota_ledger.reserve("mymemory"):
+            breakers["mymemory"].release()
+            print("Translation quota exhausted, skipping translation")
+            return f"{text} (अनुवाद उपलब्ध नहीं है)"
+
         # MyMemory Translation API - free tier with no authentication required
-        url = "https://api.mymemory.translated.net/get"
+        url = MYMEMORY_URL
 
         # Request parameters
         params = {
@@ -471,7 +664,21 @@ def translate_to_hindi(text):
             "de": "your-email@example.com"  # Optional but recommended to increase daily limit
         }
 
-        response = requests.get(url, params=params)
+        try:
+            response = requests.get(url, params=params, timeout=upstream_timeout())
+        except requests.RequestException:
+            if not budget_spent():
+                breakers["mymemory"].record_failure()
+            else:
+                # Our budget ran out, not the upstream, so any probe is left for someone else
+                breakers["mymemory"].release()
+            raise
+
+        if response.status_code != 200:
+            breakers["mymemory"].record_failure()
+        else:
+            breakers["mymemory"].record_success()
+
         if response.status_code == 200:
             data = response.json()
             if data["responseStatus"] == 200:
@@ -488,41 +695,48 @@ def translate_to_hindi(text):
         return f"{text} (अनुवाद उपलब्ध नहीं है)"
 
 
+# Hindi names of well-known companies
+HINDI_COMPANY_NAMES = {
+    "Tesla": "टेस्ला",
+    "Apple": "एप्पल",
+    "Microsoft": "माइक्रोसॉफ्ट",
+    "Google": "गूगल",
+    "Amazon": "अमेज़न",
+    "Meta": "मेटा",
+    "Facebook": "फेसबुक",
+    "Twitter": "ट्विटर",
+    "Netflix": "नेटफ्लिक्स",
+    "Nvidia": "एनविडिया",
+    "Intel": "इंटेल",
+    "AMD": "एएमडी",
+    "IBM": "आईबीएम",
+    "Oracle": "ओरेकल",
+    "Samsung": "सैमसंग"
+}
+
+# Hindi versions of the advice and outlook phrases used in summaries
+HINDI_ADVICE = {
+    "Caution advised.": "सावधानी की सलाह दी जाती है।",
+    "Potential growth expected.": "संभावित विकास की उम्मीद है।",
+    "Situation requires monitoring.": "स्थिति पर नज़र रखने की आवश्यकता है।",
+    "Consider buying stocks.": "शेयर खरीदने पर विचार करें।",
+    "Consider selling stocks.": "शेयर बेचने पर विचार करें।",
+    "Wait for more information.": "अधिक जानकारी के लिए प्रतीक्षा करें।",
+    "Recommended for investment.": "निवेश के लिए अनुशंसित है।",
+    "Not recommended for investment.": "निवेश के लिए अनुशंसित नहीं है।",
+    "Strong growth potential indicated.": "मज़बूत विकास की संभावना दिखाई देती है।",
+    "Significant challenges ahead.": "आगे महत्वपूर्ण चुनौतियाँ हैं।"
+}
+
+
 def translate_company_name(company):
     """Translate common company names to Hindi"""
-    company_dict = {
-        "Tesla": "टेस्ला",
-        "Apple": "एप्पल",
-        "Microsoft": "माइक्रोसॉफ्ट",
-        "Google": "गूगल",
-        "Amazon": "अमेज़न",
-        "Meta": "मेटा",
-        "Facebook": "फेसबुक",
-        "Twitter": "ट्विटर",
-        "Netflix": "नेटफ्लिक्स",
-        "Nvidia": "एनविडिया",
-        "Intel": "इंटेल",
-        "AMD": "एएमडी",
-        "IBM": "आईबीएम",
-        "Oracle": "ओरेकल",
-        "Samsung": "सैमसंग"
-    }
-    return company_dict.get(company, company)
+    return HINDI_COMPANY_NAMES.get(company, company)
 
 
 def translate_advice(advice):
     """Translate common advice phrases to Hindi"""
-    advice_dict = {
-        "Caution advised.": "सावधानी की सलाह दी जाती है।",
-        "Potential growth expected.": "संभावित विकास की उम्मीद है।",
-        "Situation requires monitoring.": "स्थिति पर नज़र रखने की आवश्यकता है।",
-        "Consider buying stocks.": "शेयर खरीदने पर विचार करें।",
-        "Consider selling stocks.": "शेयर बेचने पर विचार करें।",
-        "Wait for more information.": "अधिक जानकारी के लिए प्रतीक्षा करें।",
-        "Recommended for investment.": "निवेश के लिए अनुशंसित है।",
-        "Not recommended for investment.": "निवेश के लिए अनुशंसित नहीं है।"
-    }
-    return advice_dict.get(advice, advice)
+    return HINDI_ADVICE.get(advice, advice)
 
 
 def add_hindi_grammar(text):
@@ -538,50 +752,117 @@ def add_hindi_grammar(text):
     return text
 
 
-def generate_hindi_tts(text):
+# Audio formats clients can ask for, with their MIME types
+AUDIO_MIME_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg; codecs=opus",
+    "wav": "audio/wav"
+}
+
+# ffmpeg output options per format, used when transcoding
+FFMPEG_OUTPUT_ARGS = {
+    "mp3": ["-f", "mp3"],
+    "opus": ["-c:a", "libopus", "-b:a", "32k", "-f", "ogg"],
+    "wav": ["-f", "wav"]
+}
+
+# Dummy tone per audio format, built once on first use
+_dummy_audio = {}
+_dummy_audio_lock = threading.Lock()
+
+
+def generate_hindi_tts(text, audio_format="mp3"):
     """
-    Generate Hindi text-to-speech audio.
+    Generate Hindi text-to-speech audio in memory.
 
     Args:
         text (str): Hindi text to convert to speech
+        audio_format (str): Requested format, one of AUDIO_MIME_TYPES
 
     Returns:
-        str: Path to the generated audio file
+        tuple: (audio bytes, actual format), the format differs from the
+        requested one when transcoding is not available
     """
-    try:
-        # Create a temporary file
-        fd, temp_file = tempfile.mkstemp(suffix=".wav")
-        os.close(fd)
+    if not breakers["gtts"].allow():
+        print("TTS circuit open, returning dummy audio")
+        return create_dummy_audio(audio_format)
+
+    if not quota_ledger.reserve("gtts"):
+        breakers["gtts"].release()
+        print("TTS quota exhausted, returning dummy audio")
+        return create_dummy_audio(audio_format)
 
+    try:
         # Generate TTS using gTTS - make sure to specify Hindi language
+        buffer = io.BytesIO()
         tts = gTTS(text=text, lang='hi', slow=False)
-        tts.save(temp_file)
+        tts.write_to_fp(buffer)
+        breakers["gtts"].record_success()
 
-        return temp_file
+        # gTTS always produces MP3
+        return transcode_audio(buffer.getvalue(), "mp3", audio_format)
 
     except Exception as e:
         print(f"Error in TTS generation: {str(e)}")
-        # Return a dummy audio file in case of failure
-        return create_dummy_audio()
+        breakers["gtts"].record_failure()
+        # Return dummy audio in case of failure
+        return create_dummy_audio(audio_format)
 
 
-def create_dummy_audio():
-    """Create a dummy audio file for testing purposes"""
-    fd, temp_file = tempfile.mkstemp(suffix=".wav")
-    os.close(fd)
+def transcode_audio(audio_bytes, source_format, target_format):
+    """
+    Convert audio between formats by piping it through ffmpeg.
+
+    Args:
+        audio_bytes (bytes): Encoded audio
+        source_format (str): Format of audio_bytes
+        target_format (str): Requested format
 
-    # Generate a simple sine wave as dummy audio
+    Returns:
+        tuple: (audio bytes, actual format), unchanged if ffmpeg is not
+        installed or the conversion fails
+    """
+    if source_format == target_format or target_format not in FFMPEG_OUTPUT_ARGS:
+        return audio_bytes, source_format
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return audio_bytes, source_format
+
+    try:
+        # Both ends are pipes, nothing touches the disk
+        result = subprocess.run(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0"]
+            + FFMPEG_OUTPUT_ARGS[target_format] + ["pipe:1"],
+            input=audio_bytes, capture_output=True, timeout=UPSTREAM_TIMEOUT, check=True)
+        return result.stdout, target_format
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"Error transcoding audio to {target_format}: {str(e)}")
+        return audio_bytes, source_format
+
+
+def create_dummy_audio(audio_format="wav"):
+    """Return a dummy tone for testing purposes, built once per format"""
+    with _dummy_audio_lock:
+        if audio_format not in _dummy_audio:
+            if "wav" not in _dummy_audio:
+                _dummy_audio["wav"] = (_build_dummy_wav(), "wav")
+            _dummy_audio[audio_format] = transcode_audio(_dummy_audio["wav"][0], "wav", audio_format)
+        return _dummy_audio[audio_format]
+
+
+def _build_dummy_wav():
+    """Generate a simple sine wave as a WAV file in memory"""
     sample_rate = 16000
     duration = 3  # seconds
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    tone = np.sin(2 * np.pi * 440 * t)
-    tone = (tone * 32767).astype(np.int16)
+    t = np.arange(sample_rate * duration, dtype=np.float32) / sample_rate
+    tone = (np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
 
-    import wave
-    with wave.open(temp_file, 'wb') as wf:
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wf:
         wf.setnchannels(1)
         wf.setsampwidth(2)
         wf.setframerate(sample_rate)
         wf.writeframes(tone.tobytes())
 
-    return temp_file
+    return buffer.getvalue()